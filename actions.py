@@ -10,6 +10,8 @@ if TYPE_CHECKING:
     from entity import Actor, Entity, Item
 
 class Action:
+    __slots__ = ("entity",)
+
     def __init__(self, entity: Actor) -> None:
         super().__init__()
         self.entity = entity
@@ -22,6 +24,8 @@ class Action:
         raise NotImplementedError()
 
 class CardAction(Action):
+    __slots__ = ("card", "target_xy")
+
     def __init__(
         self, entity: Actor, card: Card, target_xy: Optional[Tuple[int, int]] = None
     ):
@@ -43,6 +47,7 @@ class CardAction(Action):
         self.engine.momentum = (momentum_val, self.card.suits)
 
 class PickupAction(Action):
+    __slots__ = ()
 
     def __init__(self, entity: Actor):
         super().__init__(entity)
@@ -68,6 +73,8 @@ class PickupAction(Action):
 
 
 class ItemAction(Action):
+    __slots__ = ("item", "target_xy")
+
     def __init__(
         self, entity: Actor, item: Item, target_xy: Optional[Tuple[int, int]] = None
     ):
@@ -85,14 +92,35 @@ class ItemAction(Action):
         self.item.consumable.activate(self)
 
 class DropItem(ItemAction):
+    __slots__ = ()
+
     def perform(self) -> None:
         self.entity.inventory.drop(self.item)
 
+class TakeStairsAction(Action):
+    __slots__ = ()
+
+    def perform(self) -> None:
+        location = (self.entity.x, self.entity.y)
+        game_map = self.engine.game_map
+        if location == game_map.downstairs_location:
+            self.engine.floor_manager.descend()
+            self.engine.message_log.add_message("You descend the staircase.", color.descend)
+        elif location == game_map.upstairs_location:
+            self.engine.floor_manager.ascend()
+            self.engine.message_log.add_message("You ascend the staircase.", color.descend)
+        else:
+            raise exceptions.Impossible("There are no stairs here.")
+
 class WaitAction(Action):
+    __slots__ = ()
+
     def perform(self) -> None:
         pass
 
 class PassTurn(Action):
+    __slots__ = ()
+
     def perform(self) -> None:
         self.entity.discard.add_cards(self.entity.hand.cards)
         self.entity.deck.draw_to_zone(zone=self.entity.hand, number_of_cards=5)
@@ -103,6 +131,8 @@ class PassTurn(Action):
         self.engine.handle_enemy_turns()
 
 class AttackWithDirection(Action):
+    __slots__ = ("dx", "dy")
+
     def __init__(self, entity: Actor, dx: int, dy: int):
         super().__init__(entity)
         self.dx = dx
@@ -124,6 +154,8 @@ class AttackWithDirection(Action):
         raise NotImplementedError()
 
 class BumpAction(AttackWithDirection):
+    __slots__ = ()
+
     def perform(self) -> None:
         if self.target_actor:
             return MeleeAction(self.entity, self.dx, self.dy).perform()
@@ -131,6 +163,8 @@ class BumpAction(AttackWithDirection):
             return MoveAction(self.entity, self.dx, self.dy).perform()
 
 class MeleeAction(AttackWithDirection):
+    __slots__ = ()
+
     def perform(self) -> None:
         target = self.target_actor
         if not target:
@@ -152,12 +186,13 @@ class MeleeAction(AttackWithDirection):
 
 
 class MoveAction(AttackWithDirection):
+    __slots__ = ()
 
     def perform(self) -> None:
         dest_x, dest_y = self.dest_xy
         if not self.engine.game_map.in_bounds(dest_x, dest_y):
             raise exceptions.Impossible("That way is blocked.")
-        if not self.engine.game_map.tiles["walkable"][dest_x, dest_y]:
+        if not self.engine.game_map.walkable[dest_x, dest_y]:
             raise exceptions.Impossible("That way is blocked.")
         if self.engine.game_map.get_blocking_entity_at_location(dest_x, dest_y):
             raise exceptions.Impossible("That way is blocked.")
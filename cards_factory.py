@@ -1,25 +1,14 @@
-from entity import Card
-from components import card_effects
-
-from card_suits import Suit
-
-sprint_card = Card(
-    char="-",
-    color=(255, 255, 0),
-    name="Sprint",
-    text="Move up to 3 spaces",
-    effect=card_effects.MoveEffect(move_distance=3),
-    suits=[Suit.WINGS]
-)
-
-strike_card = Card(
-    char="-",
-    color=(255, 255, 0),
-    name="Strike",
-    text="Attack an adjacent enemy for 5 damage",
-    effect=card_effects.AttackEffect(attack_range=1, attack_damage=5),
-    suits=[Suit.BLADES]
-)
-
-starter_deck = [sprint_card.duplicate() for i in range(5)]
-starter_deck.extend([strike_card.duplicate() for i in range(4)])
+'''
+Card definitions compiled from assets/data/cards.json the first time each is used,
+eg. cards_factory.sprint, and fresh copies of the deck lists in assets/data/decks.json
+as <name>_deck, eg. cards_factory.starter_deck
+'''
+
+import content
+
+def __getattr__(name: str):
+    if name.endswith("_deck") and name[:-len("_deck")] in content.decks:
+        return content.build_deck(name[:-len("_deck")])
+    if name.startswith("__") or name not in content.cards:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return content.cards.get(name)
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import os
+import pickle
+import shutil
+import uuid
+import weakref
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+from tcod.map import compute_fov
+
+from game_map import GameMap
+import lighting
+import rng
+import tile_types
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+'''
+Map storage for worlds too large to hold densely, like the planned overworld.
+The world is split into square chunks that are generated from the world seed the first
+time they are touched. At most max_chunks stay in memory; evicted chunks are dropped if
+they can be regenerated unchanged, otherwise they are compressed and spilled to disk.
+
+ChunkedMap keeps the GameMap interface: tiles, explored, walkable, transparent and visible
+index by world coordinates, each axis with an int or a slice (open-ended slices included)
+spanning any number of chunks. visible is only True inside the window of the last field of view.
+Spilled chunks live in a directory of the map's own, removed when the map is garbage collected
+or discard is called. Pickled maps carry their spilled chunks with them.
+'''
+
+ChunkGenerator = Callable[[int, np.random.Generator], np.ndarray]
+
+def scatter_chunk(size: int, generator: np.random.Generator) -> np.ndarray:
+    """Open ground with scattered walls"""
+    tiles = np.full((size, size), fill_value=tile_types.FLOOR, dtype=np.uint8, order="F")
+    tiles[generator.random((size, size)) < 0.08] = tile_types.WALL
+    return tiles
+
+def resolve_axis(index, size: int) -> Tuple[int, int, bool]:
+    """start, stop and whether the axis was indexed by an int, which drops it from the result"""
+    if isinstance(index, slice):
+        start, stop, step = index.indices(size)
+        if step != 1:
+            raise TypeError("Chunked map layers only support slices with a step of 1")
+        return start, max(start, stop), False
+    if isinstance(index, (int, np.integer)):
+        if not 0 <= index < size:
+            raise IndexError(f"{index} is outside the map")
+        return int(index), int(index) + 1, True
+    raise TypeError(f"Chunked map layers are indexed by ints and slices, not {type(index).__name__}")
+
+def resolve_index(index, width: int, height: int) -> Tuple[int, int, int, int, Tuple[int, ...]]:
+    """x1, y1, x2, y2 of the rectangle an [x, y] index covers, and the axes to drop from it"""
+    if not isinstance(index, tuple) or len(index) != 2:
+        raise TypeError("Chunked map layers are indexed [x, y]")
+    x1, x2, drop_x = resolve_axis(index[0], width)
+    y1, y2, drop_y = resolve_axis(index[1], height)
+    return x1, y1, x2, y2, tuple(axis for axis, drop in ((0, drop_x), (1, drop_y)) if drop)
+
+class Chunk:
+    def __init__(self, tiles: np.ndarray):
+        self.tiles = tiles
+        self.explored = np.zeros(tiles.shape, dtype=bool, order="F")
+        # Set once the chunk differs from what its generator would give
+        self.dirty = False
+
+class ChunkLayer:
+    """
+    View of one array of every chunk, indexed [x, y] or [x1:x2, y1:y2] in world coordinates.
+    With a field, tile ids are looked up in tile_types.palette and the view is read-only.
+    """
+    def __init__(self, chunked_map: ChunkedMap, name: str, field: Optional[str] = None):
+        self.chunked_map = chunked_map
+        self.name = name
+        self.field = field
+
+    def __getitem__(self, index):
+        x1, y1, x2, y2, dropped = resolve_index(index, self.chunked_map.width, self.chunked_map.height)
+        if len(dropped) == 2:
+            chunk, local_x, local_y = self.chunked_map.locate(x1, y1)
+            values = getattr(chunk, self.name)[local_x, local_y]
+        else:
+            values = self.chunked_map.read(self.name, x1, y1, x2, y2)
+            if dropped:
+                values = values.squeeze(axis=dropped)
+        return tile_types.palette[self.field][values] if self.field else values
+
+    def __setitem__(self, index, values) -> None:
+        if self.field:
+            raise TypeError(f"{self.field} is read-only, write tile ids instead")
+        x1, y1, x2, y2, dropped = resolve_index(index, self.chunked_map.width, self.chunked_map.height)
+        if len(dropped) == 2:
+            chunk, local_x, local_y = self.chunked_map.locate(x1, y1)
+            getattr(chunk, self.name)[local_x, local_y] = values
+            chunk.dirty = True
+        else:
+            shape = tuple(size for axis, size in enumerate((x2 - x1, y2 - y1)) if axis not in dropped)
+            values = np.broadcast_to(values, shape)
+            if dropped:
+                values = np.expand_dims(values, dropped)
+            self.chunked_map.write(self.name, x1, y1, x2, y2, values)
+
+class WindowMask:
+    """Boolean mask over a window of a width by height map, False everywhere outside it"""
+    def __init__(self, width: int, height: int, x: int = 0, y: int = 0, mask: Optional[np.ndarray] = None):
+        self.width, self.height = width, height
+        self.x, self.y = x, y
+        self.mask = mask if mask is not None else np.zeros((0, 0), dtype=bool)
+
+    def __getitem__(self, index):
+        x1, y1, x2, y2, dropped = resolve_index(index, self.width, self.height)
+        mask_width, mask_height = self.mask.shape
+        if len(dropped) == 2:
+            x, y = x1 - self.x, y1 - self.y
+            return bool(0 <= x < mask_width and 0 <= y < mask_height and self.mask[x, y])
+        values = np.zeros((x2 - x1, y2 - y1), dtype=bool, order="F")
+        left, top = max(x1, self.x), max(y1, self.y)
+        right, bottom = min(x2, self.x + mask_width), min(y2, self.y + mask_height)
+        if left < right and top < bottom:
+            values[left - x1:right - x1, top - y1:bottom - y1] = self.mask[left - self.x:right - self.x, top - self.y:bottom - self.y]
+        return values.squeeze(axis=dropped) if dropped else values
+
+class ChunkedMap(GameMap):
+    def __init__(
+        self,
+        engine: Engine,
+        width: int,
+        height: int,
+        seed: int,
+        chunk_generator: ChunkGenerator = scatter_chunk,
+        chunk_size: int = 32,
+        max_chunks: int = 64,
+        spill_dir: str = "savefiles/chunks",
+        depth: int = 0
+    ):
+        self.engine = engine
+        self.width = width
+        self.height = height
+        self.entities = set()
+        self.depth = depth
+        self.seed = seed
+        self.chunk_generator = chunk_generator
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.spill_root = spill_dir
+        self.set_spill_dir()
+
+        self.start_location: Tuple[int, int] = (width//2, height//2)
+        self.downstairs_location: Optional[Tuple[int, int]] = None
+        self.upstairs_location: Optional[Tuple[int, int]] = None
+
+        self.chunks: OrderedDict[Tuple[int, int], Chunk] = OrderedDict()
+        self.spilled: Dict[Tuple[int, int], str] = {}
+
+        self.tiles = ChunkLayer(self, "tiles")
+        self.explored = ChunkLayer(self, "explored")
+        self.visible = WindowMask(width, height)
+        self.tiles_version = 0
+        self._fov_key: Optional[Tuple[int, int, int, int]] = None
+        self.reset_awareness()
+        self.static_lights = lighting.LightMap()
+
+    def __getstate__(self) -> dict:
+        # Chunks are kept as they are, there are no cached planes to drop
+        state = self.__dict__.copy()
+        del state["_remove_spill_dir"]
+        state["spilled"] = {}
+        state["spilled_data"] = {}
+        for key, path in self.spilled.items():
+            with open(path, "rb") as f:
+                state["spilled_data"][key] = f.read()
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        spilled_data = state.pop("spilled_data")
+        self.__dict__.update(state)
+        self.set_spill_dir()
+        for key, data in spilled_data.items():
+            self.spill(key, data)
+
+    def set_spill_dir(self) -> None:
+        """A new directory of this map's own, removed along with the map"""
+        self.spill_dir = os.path.join(self.spill_root, uuid.uuid4().hex)
+        self._remove_spill_dir = weakref.finalize(self, shutil.rmtree, self.spill_dir, ignore_errors=True)
+
+    def discard(self) -> None:
+        """Drop the spilled chunks now rather than when the map is collected"""
+        self._remove_spill_dir()
+        self.spilled.clear()
+        self.set_spill_dir()
+
+    def get_chunk(self, chunk_x: int, chunk_y: int) -> Chunk:
+        key = (chunk_x, chunk_y)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+        if key in self.spilled:
+            with open(self.spilled.pop(key), "rb") as f:
+                chunk = pickle.loads(zlib.decompress(f.read()))
+        else:
+            chunk = Chunk(self.chunk_generator(self.chunk_size, rng.make_generator(self.seed, "chunk", chunk_x, chunk_y)))
+        self.chunks[key] = chunk
+        while len(self.chunks) > self.max_chunks:
+            self.evict(*self.chunks.popitem(last=False))
+        return chunk
+
+    def evict(self, key: Tuple[int, int], chunk: Chunk) -> None:
+        """Chunks that match their generated state are dropped and rebuilt on demand"""
+        if not chunk.dirty:
+            return
+        self.spill(key, zlib.compress(pickle.dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def spill(self, key: Tuple[int, int], data: bytes) -> None:
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"{key[0]}_{key[1]}.chunk")
+        with open(path, "wb") as f:
+            f.write(data)
+        self.spilled[key] = path
+
+    def flush(self) -> None:
+        """Spill every changed chunk in memory, eg. before saving"""
+        for key, chunk in self.chunks.items():
+            self.evict(key, chunk)
+            chunk.dirty = False
+
+    def locate(self, x: int, y: int) -> Tuple[Chunk, int, int]:
+        if not self.in_bounds(x, y):
+            raise IndexError(f"{x}, {y} is outside the map")
+        return self.get_chunk(x // self.chunk_size, y // self.chunk_size), x % self.chunk_size, y % self.chunk_size
+
+    def chunk_spans(self, x1: int, y1: int, x2: int, y2: int):
+        """For each chunk overlapping the rectangle, yield its key, the slices into the chunk and into the rectangle"""
+        size = self.chunk_size
+        for chunk_x in range(x1 // size, (x2 - 1) // size + 1):
+            for chunk_y in range(y1 // size, (y2 - 1) // size + 1):
+                left, top = max(x1, chunk_x * size), max(y1, chunk_y * size)
+                right, bottom = min(x2, (chunk_x+1) * size), min(y2, (chunk_y+1) * size)
+                chunk_slice = (slice(left - chunk_x*size, right - chunk_x*size), slice(top - chunk_y*size, bottom - chunk_y*size))
+                window_slice = (slice(left - x1, right - x1), slice(top - y1, bottom - y1))
+                yield (chunk_x, chunk_y), chunk_slice, window_slice
+
+    def clip(self, x1: Optional[int], y1: Optional[int], x2: Optional[int], y2: Optional[int]) -> Tuple[int, int, int, int]:
+        x1, y1 = max(0, x1 or 0), max(0, y1 or 0)
+        x2 = self.width if x2 is None else min(x2, self.width)
+        y2 = self.height if y2 is None else min(y2, self.height)
+        return x1, y1, max(x1, x2), max(y1, y2)
+
+    def read(self, name: str, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+        """Copy a rectangle of one chunk array, clipped to the map"""
+        x1, y1, x2, y2 = self.clip(x1, y1, x2, y2)
+        dtype = np.uint8 if name == "tiles" else bool
+        window = np.zeros((x2 - x1, y2 - y1), dtype=dtype, order="F")
+        if window.size:
+            for key, chunk_slice, window_slice in self.chunk_spans(x1, y1, x2, y2):
+                window[window_slice] = getattr(self.get_chunk(*key), name)[chunk_slice]
+        return window
+
+    def write(self, name: str, x1: int, y1: int, x2: int, y2: int, values) -> None:
+        x1, y1, x2, y2 = self.clip(x1, y1, x2, y2)
+        values = np.broadcast_to(values, (x2 - x1, y2 - y1))
+        if not values.size:
+            return
+        for key, chunk_slice, window_slice in self.chunk_spans(x1, y1, x2, y2):
+            chunk = self.get_chunk(*key)
+            getattr(chunk, name)[chunk_slice] = values[window_slice]
+            chunk.dirty = True
+
+    def set_tiles(self, index, tile_id) -> None:
+        self.tiles[index] = tile_id
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        self.tiles_version += 1
+
+    def plane(self, name: str) -> ChunkLayer:
+        return ChunkLayer(self, "tiles", field=name)
+
+    def update_fov(self, x: int, y: int, radius: int) -> None:
+        """Field of view over the tiles within radius only, so it never loads more than a few chunks"""
+        key = (x, y, radius, self.tiles_version)
+        if key == self._fov_key:
+            return
+        self._fov_key = key
+
+        x1, y1, x2, y2 = self.clip(x - radius, y - radius, x + radius + 1, y + radius + 1)
+        transparent = self.transparent[x1:x2, y1:y2]
+        visible = compute_fov(transparent, (x - x1, y - y1), radius=radius)
+        self.visible = WindowMask(self.width, self.height, x1, y1, visible)
+        self.explored[x1:x2, y1:y2] = self.explored[x1:x2, y1:y2] | visible
@@ -22,6 +22,7 @@ impossible = (0x80, 0x80,0x80)
 error = (0xFF, 0x40, 0x40)
 
 welcome_text = (0x20, 0xA0, 0xFF)
+descend = (0x9F, 0x3F, 0xFF)
 health_recovered = (0x0, 0xFF, 0x0)
 
 bar_text = white
@@ -32,4 +33,5 @@ menu_title = (255, 255, 63)
 menu_text = white
 
 highlight = (255, 255, 0)
+valid_target = (0x20, 0x60, 0x30)
 momentum = (0xFF, 0x33, 0xFF)
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import random
 from typing import List, Optional, Tuple, TYPE_CHECKING
 
 import numpy as np
@@ -13,6 +12,7 @@ if TYPE_CHECKING:
     from entity import Actor
 
 class BaseAI(Action):
+    __slots__ = ()
 
     entity: Actor
 
@@ -24,7 +24,7 @@ class BaseAI(Action):
 
     def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
 
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
+        cost = np.array(self.entity.gamemap.walkable, dtype=np.int8)
 
         #If there's a blocking entity and the cost isn't 0 (blocking)
         for entity in self.entity.gamemap.entities:
@@ -45,6 +45,8 @@ class BaseAI(Action):
         return [(index[0], index[1]) for index in path]
 
 class ConfusedEnemy(BaseAI):
+    __slots__ = ("previous_ai", "turns_remaining")
+
     def __init__(self, entity: Actor, previous_ai: Optional[BaseAI], turns_remaining: int):
         super().__init__(entity)
         self.previous_ai = previous_ai
@@ -55,7 +57,7 @@ class ConfusedEnemy(BaseAI):
             self.engine.message_log.add_message(f"The {self.entity.name} is no longer confused.")
             self.entity.ai = self.previous_ai
         else:
-            direction_x, direction_y = random.choice(
+            direction_x, direction_y = self.engine.rng.choice(
                 [
                 (-1, -1),
                 (0, -1),
@@ -75,6 +77,8 @@ class ConfusedEnemy(BaseAI):
 
 
 class HostileEnemy(BaseAI):
+    __slots__ = ("path",)
+
     def __init__(self, entity: Actor):
         super().__init__(entity)
         self.path: List[Tuple[Int, Int]] = []
@@ -85,7 +89,7 @@ class HostileEnemy(BaseAI):
         dy = target.y - self.entity.y
         distance = max(abs(dx), abs(dy)) #Chebyshev Distance
 
-        if self.engine.game_map.visible[self.entity.x, self.entity.y]:
+        if self.engine.game_map.can_see_target(self.entity):
             if distance <= 1:
                 return MeleeAction(self.entity, dx, dy).perform()
 
@@ -101,6 +105,8 @@ class HostileEnemy(BaseAI):
         return None
 
 class BansheeAI(BaseAI):
+    __slots__ = ("path", "move_speed", "attack_radius")
+
     def __init__(self, entity: Actor, move_speed: int=3, attack_radius: int=1):
         super().__init__(entity)
         self.path: List[Tuple[int, int]] = []
@@ -108,7 +114,7 @@ class BansheeAI(BaseAI):
         self.attack_radius = attack_radius
 
     def perform(self) -> None:
-        if self.engine.game_map.visible[self.entity.x, self.entity.y]:
+        if self.engine.game_map.can_see_target(self.entity):
 
             for tile in self.get_attack().get_tile_list():
                 target = self.engine.game_map.get_actor_at_location(*tile)
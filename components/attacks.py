@@ -37,7 +37,7 @@ class RayAttack(AttackPattern):
         self.tile_list = []
         for i in range(self.MAX_DISTANCE):
             tile = (self.x + dx*i, self.y + dy*i)
-            if gamemap.tiles[tile[0], tile[1]]["transparent"]:
+            if gamemap.transparent[tile[0], tile[1]]:
                 self.tile_list.append(tile)
             else:
                 break
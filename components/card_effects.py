@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from typing import Optional, TYPE_CHECKING
+from typing import FrozenSet, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+import tcod
 
 from input_handler import (
     ActionOrHandler,
@@ -11,73 +14,132 @@ import color
 
 from actions import CardAction
 from entity import Card, Actor
-from components.base_component import BaseComponent
 from exceptions import Impossible
 
-class CardEffect(BaseComponent):
-    parent: Card
-
-    def get_action(self, user: Actor) -> Optional[ActionOrHandler]:
-        return CardAction(user, self)
+if TYPE_CHECKING:
+    from game_map import GameMap
+
+def blocked_locations(game_map: GameMap) -> FrozenSet[Tuple[int, int]]:
+    return frozenset((entity.x, entity.y) for entity in game_map.entities if entity.blocks_movement)
+
+class CardEffect:
+    """
+    Shared by every copy of a card through its CardDefinition, so effects only hold parameters
+    and are given the card and its user
+    """
+
+    def get_action(self, card: Card, user: Actor) -> Optional[ActionOrHandler]:
+        return CardAction(user, card)
+
+    def valid_targets(self, card: Card, user: Actor) -> np.ndarray:
+        """
+        Boolean mask over the map of the tiles the card can be played on. The mask is kept on the
+        card, and only recomputed when the user, the tiles, the field of view or a blocking
+        entity has moved, so once a turn.
+        """
+        game_map = user.gamemap
+        blocked = blocked_locations(game_map)
+        key = (id(game_map), id(user), user.x, user.y, game_map.tiles_version, game_map.fov_key, blocked)
+        if key != card.targets_key:
+            card.targets_key = key
+            card.targets = self.compute_targets(game_map, user, blocked)
+            card.targets.flags.writeable = False
+        return card.targets
+
+    def compute_targets(self, game_map: GameMap, user: Actor, blocked: FrozenSet[Tuple[int, int]]) -> np.ndarray:
+        """Cards without a target have none"""
+        return np.zeros((game_map.width, game_map.height), dtype=bool, order="F")
 
     def activate(self, action: CardAction) -> None:
         raise NotImplementedError()
 
-    def discard(self) -> None:
-        self.parent.move_to_zone(self.engine.player.discard)
+    def discard(self, card: Card, user: Actor) -> None:
+        card.move_to_zone(user.discard)
 
 class MoveEffect(CardEffect):
     def __init__(self, move_distance: int):
         self.move_distance = move_distance
 
-    def get_action(self, user: Actor) -> SingleRangedAttackHandler:
+    def get_action(self, card: Card, user: Actor) -> SingleRangedAttackHandler:
         return SingleRangedAttackHandler(
-            self.engine,
-            callback=lambda xy: CardAction(self.engine.player, self.parent, xy)
+            user.gamemap.engine,
+            callback=lambda xy: CardAction(user, card, xy),
+            targets=self.valid_targets(card, user)
         )
 
+    def compute_targets(self, game_map: GameMap, user: Actor, blocked: FrozenSet[Tuple[int, int]]) -> np.ndarray:
+        """Visible, walkable and unoccupied tiles reachable in move_distance steps, diagonals included"""
+        window = game_map.fov_window(user.x, user.y, self.move_distance)
+        x1, y1 = window[0].start, window[1].start
+        open_tiles = game_map.walkable[window] & game_map.visible[window]
+        width, height = open_tiles.shape
+        for x, y in blocked:
+            if 0 <= x - x1 < width and 0 <= y - y1 < height:
+                open_tiles[x - x1, y - y1] = False
+
+        cost = open_tiles.astype(np.int8)
+        cost[user.x - x1, user.y - y1] = 1
+        distance = tcod.path.maxarray(cost.shape, order="F")
+        distance[user.x - x1, user.y - y1] = 0
+        tcod.path.dijkstra2d(distance, cost, 1, 1, out=distance)
+
+        targets = super().compute_targets(game_map, user, blocked)
+        targets[window] = open_tiles & (distance <= self.move_distance)
+        return targets
+
     def activate(self, action: CardAction) -> None:
+        user = action.entity
+        game_map = action.engine.game_map
         target_x, target_y = action.target_xy
-        dx = target_x - self.engine.player.x
-        dy = target_y - self.engine.player.y
-        if not self.engine.game_map.visible[action.target_xy]:
+        if not game_map.in_bounds(target_x, target_y):
+            raise Impossible("That way is blocked.")
+        if not game_map.visible[target_x, target_y]:
             raise Impossible("You cannot move somewhere you cannot see!")
-        if not self.engine.game_map.in_bounds(target_x, target_y):
-            raise exceptions.Impossible("That way is blocked.")
-        if not self.engine.game_map.tiles["walkable"][target_x, target_y]:
-            raise exceptions.Impossible("That way is blocked.")
-        if self.engine.game_map.get_blocking_entity_at_location(target_x, target_y):
-            raise exceptions.Impossible("That way is blocked.")
-        if max(dx, dy) > self.move_distance:
+        if not game_map.walkable[target_x, target_y]:
+            raise Impossible("That way is blocked.")
+        if game_map.get_blocking_entity_at_location(target_x, target_y):
+            raise Impossible("That way is blocked.")
+        if not self.valid_targets(action.card, user)[target_x, target_y]:
             raise Impossible("You cannot move that far.")
 
-        self.engine.player.move(dx, dy)
-        self.discard()
+        user.move(target_x - user.x, target_y - user.y)
+        self.discard(action.card, user)
 
 class AttackEffect(CardEffect):
     def __init__(self, attack_range: int, attack_damage: int):
         self.attack_range = attack_range
         self.attack_damage = attack_damage
 
-    def get_action(self, user: Actor) -> SingleRangedAttackHandler:
+    def get_action(self, card: Card, user: Actor) -> SingleRangedAttackHandler:
         return SingleRangedAttackHandler(
-            self.engine,
-            callback=lambda xy: CardAction(self.engine.player, self.parent, xy)
+            user.gamemap.engine,
+            callback=lambda xy: CardAction(user, card, xy),
+            targets=self.valid_targets(card, user)
         )
 
+    def compute_targets(self, game_map: GameMap, user: Actor, blocked: FrozenSet[Tuple[int, int]]) -> np.ndarray:
+        """Visible living actors other than the user within attack_range in both directions"""
+        targets = super().compute_targets(game_map, user, blocked)
+        for actor in game_map.actors:
+            if actor is not user and max(abs(actor.x - user.x), abs(actor.y - user.y)) <= self.attack_range:
+                targets[actor.x, actor.y] = game_map.visible[actor.x, actor.y]
+        return targets
+
     def activate(self, action: CardAction) -> None:
+        user = action.entity
+        game_map = action.engine.game_map
         target_x, target_y = action.target_xy
+        if not game_map.in_bounds(target_x, target_y):
+            raise Impossible("There is nothing to attack there.")
         target_actor = action.target_actor
         if not target_actor:
             raise Impossible("There is nothing to attack there.")
-        damage = max(0, self.attack_damage - target_actor.fighter.defense)
-        dx = target_x - self.engine.player.x
-        dy = target_y - self.engine.player.y
-        if not self.engine.game_map.visible[action.target_xy]:
+        if not game_map.visible[target_x, target_y]:
             raise Impossible("You cannot attack somewhere you cannot see!")
-        if max(dx, dy) > self.attack_range:
+        if not self.valid_targets(action.card, user)[target_x, target_y]:
             raise Impossible("You cannot attack that far away.")
+        damage = max(0, self.attack_damage - target_actor.fighter.defense)
 
         target_actor.fighter.hp -= damage
-        self.engine.message_log.add_message(f"You strike the {target_actor.name} for {damage} damage!", color.player_atk)
-        self.discard()
+        action.engine.message_log.add_message(f"You strike the {target_actor.name} for {damage} damage!", color.player_atk)
+        self.discard(action.card, user)
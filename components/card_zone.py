@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List, Optional, TYPE_CHECKING
+from typing import Dict, List, Optional, TYPE_CHECKING
 import random
 
 from components.base_component import BaseComponent
@@ -11,17 +11,31 @@ if TYPE_CHECKING:
     from entity import Actor, Card
 
 class CardZone(BaseComponent):
+    """
+    Cards are kept as the keys of an insertion-ordered dict, so moving a card between
+    zones is O(1) while the order cards arrived in (eg. the hand layout) is kept
+    """
+    __slots__ = ("_cards",)
+
     parent: Actor
 
     def __init__(self, cards: Optional[List[Card]] = None):
-        self.cards: List[Card] = []
+        self._cards: Dict[Card, None] = {}
         if cards:
             self.add_cards(cards)
 
+    @property
+    def cards(self) -> List[Card]:
+        """A copy, safe to iterate while moving cards"""
+        return list(self._cards)
+
+    def __contains__(self, card: Card) -> bool:
+        return card in self._cards
+
     def add_card(self, card: Card) -> None:
-        self.cards.append(card)
-        if card.parent:
+        if card.parent is not None:
             card.parent.remove_card(card)
+        self._cards[card] = None
         card.parent = self
 
     def add_cards(self, cards: List[Card]) -> None:
@@ -30,19 +44,26 @@ class CardZone(BaseComponent):
 
     def remove_card(self, card: Card) -> None:
         try:
-            self.cards.remove(card)
-            card.parent = None
-        except ValueError:
-            raise Impossible(f"{card.name} is not in this zone.")
+            del self._cards[card]
+        except KeyError:
+            raise exceptions.Impossible(f"{card.name} is not in this zone.")
+        card.parent = None
 
     @property
     def size(self) -> int:
-        return len(self.cards)
+        return len(self._cards)
 
 class Deck(CardZone):
-    discard: Optional[CardZone] = None
-    def __init__(self, cards: Optional[List[Card]] = None):
+    """
+    The top of the deck is the last card added.
+    deck_size counts every card belonging to the deck, wherever it currently is.
+    """
+    __slots__ = ("deck_size", "rng", "discard")
+
+    def __init__(self, cards: Optional[List[Card]] = None, rng: Optional[random.Random] = None):
+        self.discard: Optional[CardZone] = None
         self.deck_size = 0
+        self.rng = rng if rng else random.Random()
         super().__init__(cards)
 
     def link_discard(self, discard: CardZone) -> None:
@@ -50,41 +71,44 @@ class Deck(CardZone):
 
     def add_card(self, card: Card) -> None:
         super().add_card(card)
-        if card.deck != self:
+        if card.deck is not self:
             card.deck = self
             self.deck_size += 1
 
-    def remove_card(self, card: Card) -> None:
-        try:
-            super().remove_card(card)
-            self.deck_size -= 1
-        except:
-            pass
+    def draw(self) -> Optional[Card]:
+        """Take the top card, shuffling the discard back in first if the deck is empty"""
+        if not self._cards:
+            self.reshuffle_discard()
+        if not self._cards:
+            return None
+        card, _ = self._cards.popitem()
+        card.parent = None
+        return card
+
+    def reshuffle_discard(self) -> None:
+        if self.discard:
+            self.add_cards(self.discard.cards)
+        self.shuffle()
 
     def draw_and_replace(self, number_of_cards: int = 1) -> List[Card]:
-        cards_drawn: List[Card] = []
-        for i in range(number_of_cards):
-            shuffle()
-            cards_drawn.append(self.cards[0])
-
-        shuffle()
+        """Look at random cards with replacement, then shuffle"""
+        cards = self.cards
+        cards_drawn = [self.rng.choice(cards) for i in range(number_of_cards)] if cards else []
+        self.shuffle()
         return cards_drawn
 
     def draw_to_zone(self,  zone: CardZone, number_of_cards: int = 1) -> List[Card]:
+        """Draws stop early only when the deck and discard together run out"""
         cards_drawn: List[Card] = []
-        if number_of_cards > self.size:
-            first_draw = self.size
-            self.draw_to_zone(zone, first_draw)
-            if self.discard:
-                self.add_cards(self.discard.cards)
-                self.shuffle()
-                second_draw = min(number_of_cards - first_draw, self.size)
-                self.draw_to_zone(zone, second_draw)
-        else:
-            for i in range(number_of_cards):
-                cards_drawn.append(self.cards.pop())
+        for i in range(number_of_cards):
+            card = self.draw()
+            if card is None:
+                break
+            cards_drawn.append(card)
         zone.add_cards(cards_drawn)
         return cards_drawn
 
     def shuffle(self) -> None:
-        random.shuffle(self.cards)
+        cards = list(self._cards)
+        self.rng.shuffle(cards)
+        self._cards = dict.fromkeys(cards)
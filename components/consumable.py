@@ -19,6 +19,8 @@ if TYPE_CHECKING:
 
 
 class Consumable(BaseComponent):
+    __slots__ = ()
+
     parent: Item
 
     def get_action(self, consumer: Actor) -> Optional[ActionOrHandler]:
@@ -35,6 +37,8 @@ class Consumable(BaseComponent):
 
 
 class ConfusionConsumable(Consumable):
+    __slots__ = ("number_of_turns",)
+
     def __init__(self, number_of_turns: int):
         self.number_of_turns = number_of_turns
 
@@ -67,6 +71,8 @@ class ConfusionConsumable(Consumable):
 
 
 class HealingConsumable(Consumable):
+    __slots__ = ("amount",)
+
     def __init__(self, amount: int):
         self.amount = amount
 
@@ -85,6 +91,8 @@ class HealingConsumable(Consumable):
 
 
 class FireballDamageConsumable(Consumable):
+    __slots__ = ("damage", "radius")
+
     def __init__(self, damage: int, radius: int):
         self.damage = damage
         self.radius = radius
@@ -121,6 +129,8 @@ class FireballDamageConsumable(Consumable):
 
 
 class LightningDamageConsumable(Consumable):
+    __slots__ = ("damage", "maximum_range")
+
     def __init__(self, damage: int, maximum_range: int):
         self.damage = damage
         self.maximum_range = maximum_range
@@ -1,15 +1,19 @@
 from __future__ import annotations
 
+import sys
 from typing import TYPE_CHECKING
 
 import color
 from components.base_component import BaseComponent
+from entity import intern_color
 from render_order import RenderOrder
 
 if TYPE_CHECKING:
     from entity import Actor
 
 class Fighter(BaseComponent):
+    __slots__ = ("max_hp", "_hp", "defense", "power")
+
     parent: Actor
 
     def __init__(self, hp: int, defense: int, power: int):
@@ -55,10 +59,10 @@ class Fighter(BaseComponent):
             death_message_color = color.enemy_die
 
         self.parent.char = "%"
-        self.parent.color = (191, 0, 0)
+        self.parent.color = intern_color((191, 0, 0))
         self.parent.blocks_movement = False
         self.parent.ai = None
-        self.parent.name = f"remains of {self.parent.name}"
+        self.parent.name = sys.intern(f"remains of {self.parent.name}")
         self.parent.render_order = RenderOrder.CORPSE
 
         self.engine.message_log.add_message(death_message, death_message_color)
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import importlib
+import json
+import os
+from typing import Any, Callable, Dict, List
+
+from card_suits import Suit
+from components.card_zone import CardZone, Deck
+from components.fighter import Fighter
+from components.inventory import Inventory
+from components.level import Level
+from entity import Actor, Card, CardDefinition, Entity, Item
+
+'''
+Cards, decks, monsters and items are declared in the json files of DATA_DIR.
+Each Registry reads its file the first time it's used and compiles an entry into a
+prototype the first time its key is asked for, so importing the game builds nothing
+and startup doesn't grow with the amount of content.
+
+Components are named by class, eg. {"type": "HealingConsumable", "amount": 4}, and
+the remaining keys are passed to the constructor. Their modules are only imported
+when the first prototype needing them is compiled.
+'''
+
+DATA_DIR = "assets/data"
+
+class Registry:
+    def __init__(self, filename: str, compile_entry: Callable[[str, Any], Any]):
+        self.path = os.path.join(DATA_DIR, filename)
+        self.compile_entry = compile_entry
+        self._data: Dict[str, Any] = {}
+        self._loaded = False
+        self._prototypes: Dict[str, Any] = {}
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        if not self._loaded:
+            with open(self.path) as f:
+                self._data = json.load(f)
+            self._loaded = True
+        return self._data
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.data
+
+    def get(self, key: str) -> Any:
+        prototype = self._prototypes.get(key)
+        if prototype is None:
+            if key not in self.data:
+                raise KeyError(f"{key!r} is not defined in {self.path}")
+            prototype = self._prototypes[key] = self.compile_entry(key, self.data[key])
+        return prototype
+
+def component_class(module: str, name: str) -> type:
+    return getattr(importlib.import_module(module), name)
+
+def make_component(module: str, spec: Dict[str, Any]) -> Any:
+    params = {key: value for key, value in spec.items() if key != "type"}
+    return component_class(module, spec["type"])(**params)
+
+def compile_card(key: str, entry: Dict[str, Any]) -> CardDefinition:
+    return CardDefinition(
+        key=key,
+        char=entry.get("char", "?"),
+        color=tuple(entry.get("color", (255, 255, 255))),
+        name=entry["name"],
+        text=entry.get("text", "<None>"),
+        effect=make_component("components.card_effects", entry["effect"]),
+        suits=[Suit[suit] for suit in entry["suits"]]
+    )
+
+def compile_entity(key: str, entry: Dict[str, Any]) -> Entity:
+    appearance = dict(char=entry.get("char", "?"), color=tuple(entry.get("color", (255, 255, 255))), name=entry["name"])
+    if entry["kind"] == "actor":
+        card_handler = None
+        if "deck" in entry:
+            card_handler = (Deck(build_deck(entry["deck"])), CardZone(), CardZone())
+        return Actor(
+            **appearance,
+            ai_cls=component_class("components.ai", entry["ai"]),
+            fighter=Fighter(**entry["fighter"]),
+            inventory=Inventory(**entry.get("inventory", {"capacity": 0})),
+            level=Level(**entry.get("level", {})),
+            card_handler=card_handler,
+            sight_radius=entry.get("sight_radius", 8)
+        )
+    if entry["kind"] == "item":
+        return Item(**appearance, consumable=make_component("components.consumable", entry["consumable"]))
+    raise ValueError(f"Unknown kind {entry['kind']!r} for {key!r}")
+
+cards = Registry("cards.json", compile_card)
+decks = Registry("decks.json", lambda key, entry: entry)
+entities = Registry("entities.json", compile_entity)
+
+def build_deck(name: str) -> List[Card]:
+    """New card handles for a deck list, eg. {"sprint": 5, "strike": 4}"""
+    return [Card(cards.get(key)) for key, count in decks.get(name).items() for i in range(count)]
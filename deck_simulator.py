@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+from card_suits import Suit
+import content
+from engine import Engine
+import rng
+
+'''
+Plays a deck list many times over, headless, to tune deck composition and momentum, eg.
+
+    python deck_simulator.py --deck starter --runs 1000000 --turns 30
+    python deck_simulator.py --cards sprint=6,strike=3 --output sprint_heavy.npz
+    python deck_simulator.py --momentum 2
+
+Every run is one row of an array, so each turn is a handful of array operations over all runs.
+Turns follow the game: draw a hand, play cards, then PassTurn discards the hand and draws a
+new one, shuffling the discard back in when the deck runs out. The histograms are saved to
+an .npz file as well as summarised.
+
+Cards are reduced to a bitmask of their suits. The player is modelled greedily: first play
+every card sharing a suit with the last card played (free), then for each point of momentum
+start the largest group of remaining cards sharing one suit. Momentum defaults to
+Engine.momentum_max. That is exact when each card has one suit, like every current card,
+and a lower bound on what a player could chain otherwise.
+'''
+
+SUITS = list(Suit)
+
+def suit_mask(suits: List[str]) -> int:
+    mask = 0
+    for name in suits:
+        mask |= 1 << SUITS.index(Suit[name])
+    return mask
+
+def deck_masks(deck_list: Dict[str, int]) -> np.ndarray:
+    """Suit bitmask of every card in a deck list, read straight from the card data without compiling effects"""
+    return np.array([
+        suit_mask(content.cards.data[key]["suits"])
+        for key, count in deck_list.items()
+        for i in range(count)
+    ], dtype=np.uint16)
+
+def deck_suits(masks: np.ndarray) -> np.ndarray:
+    """Bit positions of the suits present in a deck, the only ones worth counting"""
+    combined = np.bitwise_or.reduce(masks)
+    return np.array([bit for bit in range(len(SUITS)) if combined >> bit & 1], dtype=np.uint16)
+
+def suit_counts(masks: np.ndarray, suits: np.ndarray) -> np.ndarray:
+    """(runs, hand) masks to (runs, suits) counts of cards having each suit"""
+    return np.stack([np.count_nonzero(masks & (1 << bit), axis=1) for bit in suits.tolist()], axis=1)
+
+HISTOGRAMS = ("largest_group", "plays", "free_plays", "suit_present", "reshuffle_turns")
+
+class Tally:
+    """Histograms summed over turns and runs, so batches from different workers can be added together"""
+    def __init__(self, hand_size: int, turns: int, momentum: int):
+        self.hand_size = hand_size
+        self.turns = turns
+        self.momentum = momentum
+        self.runs = 0
+        self.largest_group = np.zeros(hand_size + 1, dtype=np.int64)
+        self.plays = np.zeros(hand_size + 1, dtype=np.int64)
+        self.free_plays = np.zeros(hand_size + 1, dtype=np.int64)
+        self.suit_present = np.zeros(len(SUITS), dtype=np.int64)
+        self.reshuffle_turns = np.zeros(turns, dtype=np.int64)
+
+    def __iadd__(self, other: Tally) -> Tally:
+        self.runs += other.runs
+        for name in HISTOGRAMS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+def simulate_batch(masks: np.ndarray, runs: int, turns: int, hand_size: int, momentum: int, seed: int) -> Tally:
+    generator = np.random.default_rng(seed)
+    deck_size = len(masks)
+    hand_size = min(hand_size, deck_size)
+    tally = Tally(hand_size, turns, momentum)
+    tally.runs = runs
+    suits = deck_suits(masks)
+
+    # order[:, :position] have been drawn, the deck is order[:, position:]
+    order = generator.permuted(np.tile(np.arange(deck_size, dtype=np.int16), (runs, 1)), axis=1)
+    position = 0
+    carried = np.zeros(runs, dtype=np.uint16)
+    rows = np.arange(runs)
+
+    for turn in range(turns):
+        remaining = deck_size - position
+        if remaining >= hand_size:
+            hand = order[:, position:position + hand_size]
+            position += hand_size
+        else:
+            # The hand was already discarded, so everything but the deck remainder is reshuffled
+            order = np.concatenate([order[:, position:], generator.permuted(order[:, :position], axis=1)], axis=1)
+            hand = order[:, :hand_size]
+            position = hand_size
+            tally.reshuffle_turns[turn] = 1
+
+        hand_masks = masks[hand]
+        counts = suit_counts(hand_masks, suits)
+        largest = counts.max(axis=1)
+        tally.largest_group += np.bincount(largest, minlength=hand_size + 1)
+        tally.suit_present[suits] += (counts > 0).sum(axis=0)
+
+        chains = (hand_masks & carried[:, np.newaxis]) != 0
+        free = chains.sum(axis=1)
+        leftover = np.where(chains, 0, hand_masks)
+        played = free
+        for point in range(momentum):
+            leftover_counts = suit_counts(leftover, suits)
+            best_suit = leftover_counts.argmax(axis=1)
+            paid = leftover_counts[rows, best_suit]
+            best_mask = np.uint16(1) << suits[best_suit]
+            leftover = np.where((leftover & best_mask[:, np.newaxis]) != 0, 0, leftover)
+            played = played + paid
+            carried = np.where(paid > 0, best_mask, carried)
+        tally.free_plays += np.bincount(free, minlength=hand_size + 1)
+        tally.plays += np.bincount(played, minlength=hand_size + 1)
+    return tally
+
+def run(
+    deck_list: Dict[str, int],
+    runs: int,
+    turns: int,
+    hand_size: int,
+    base_seed: int,
+    workers: int,
+    momentum: int = Engine.momentum_max,
+    batch_size: int = 100_000
+) -> Tally:
+    masks = deck_masks(deck_list)
+    batches = [min(batch_size, runs - start) for start in range(0, runs, batch_size)]
+    seeds = [rng.stream_seed(base_seed, "deck_simulator", i) for i in range(len(batches))]
+    tally = Tally(min(hand_size, len(masks)), turns, momentum)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_tally in executor.map(
+            simulate_batch,
+            [masks]*len(batches),
+            batches,
+            [turns]*len(batches),
+            [hand_size]*len(batches),
+            [momentum]*len(batches),
+            seeds
+        ):
+            tally += batch_tally
+    return tally
+
+def parse_deck_list(text: str) -> Dict[str, int]:
+    """"sprint=5,strike=4" to {"sprint": 5, "strike": 4}"""
+    deck_list = {}
+    for item in text.split(","):
+        key, _, count = item.partition("=")
+        deck_list[key.strip()] = int(count or 1)
+    return deck_list
+
+def report(tally: Tally) -> None:
+    hands = tally.runs * tally.turns
+    print(f"{tally.runs} runs of {tally.turns} turns, hand size {tally.hand_size}, momentum {tally.momentum}")
+
+    print("Largest group of one suit in hand:")
+    for size, count in enumerate(tally.largest_group):
+        if size:
+            print(f"  {size}: {count / hands:8.4f}")
+    print("Chance a hand holds a suit:")
+    for suit, count in zip(SUITS, tally.suit_present):
+        if count:
+            print(f"  {suit.name:>8}: {count / hands:8.4f}")
+
+    sizes = np.arange(tally.hand_size + 1)
+    print(f"Cards played per turn: mean {(sizes * tally.plays).sum() / hands:.4f}")
+    for size, count in enumerate(tally.plays):
+        print(f"  {size}: {count / hands:8.4f}")
+    print(f"Free plays chained from the last turn: mean {(sizes * tally.free_plays).sum() / hands:.4f}, "
+          f"chance of any {1 - tally.free_plays[0] / hands:.4f}")
+
+    reshuffles = np.flatnonzero(tally.reshuffle_turns)
+    print(f"Reshuffles: {len(reshuffles)} in {tally.turns} turns, on turns {reshuffles.tolist()}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulate shuffles, draws and momentum chains for a deck list.")
+    deck = parser.add_mutually_exclusive_group()
+    deck.add_argument("--deck", default="starter", help="deck list from assets/data/decks.json")
+    deck.add_argument("--cards", help="deck list given as key=count pairs, eg. sprint=5,strike=4")
+    parser.add_argument("--runs", type=int, default=100_000)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--hand-size", type=int, default=5)
+    parser.add_argument("--momentum", type=int, default=Engine.momentum_max, help="paid chains per turn (default: Engine.momentum_max)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--output", default="deck_simulator.npz")
+    args = parser.parse_args()
+
+    deck_list = parse_deck_list(args.cards) if args.cards else content.decks.get(args.deck)
+
+    start_time = time.perf_counter()
+    tally = run(deck_list, args.runs, args.turns, args.hand_size, args.seed, args.workers, momentum=args.momentum)
+    elapsed = time.perf_counter() - start_time
+
+    np.savez(
+        args.output,
+        **{name: getattr(tally, name) for name in HISTOGRAMS},
+        runs=tally.runs,
+        turns=tally.turns,
+        hand_size=tally.hand_size,
+        momentum=tally.momentum,
+        deck_keys=np.array(list(deck_list.keys())),
+        deck_counts=np.array(list(deck_list.values())),
+    )
+
+    print(f"Simulated in {elapsed:.2f}s, saved to {args.output}")
+    report(tally)
+
+if __name__ == "__main__":
+    main()
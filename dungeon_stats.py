@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+import tcod
+
+from generator import connectivity
+import procgen
+import rng
+import tile_types
+
+'''
+Generates floors in bulk from seeds and records quality metrics for each one.
+Used to tune procgen.generate_layout, eg.
+
+    python dungeon_stats.py --count 5000 --turn-prob 0.3 --output turn_03.npz
+
+Results are saved as one column per metric in an .npz file.
+'''
+
+COLUMNS = (
+    "seed",
+    "generation_time",
+    "floor_ratio",
+    "rooms",
+    "reachable_ratio",
+    "dead_ends",
+    "regions",
+)
+
+def count_dead_ends(walkable: np.ndarray) -> int:
+    """Walkable tiles with exactly one walkable cardinal neighbour"""
+    padded = np.pad(walkable, 1)
+    neighbours = (
+        padded[:-2, 1:-1].astype(np.int8)
+        + padded[2:, 1:-1]
+        + padded[1:-1, :-2]
+        + padded[1:-1, 2:]
+    )
+    return int(np.count_nonzero(walkable & (neighbours == 1)))
+
+def reachable_ratio(walkable: np.ndarray, start: Tuple[int, int]) -> float:
+    distance = tcod.path.maxarray(walkable.shape, order="F")
+    distance[start] = 0
+    tcod.path.dijkstra2d(distance, walkable.astype(np.int8), 1, 1, out=distance)
+    reachable = np.count_nonzero(distance != np.iinfo(distance.dtype).max)
+    return reachable / max(1, np.count_nonzero(walkable))
+
+def measure_floor(seed: int, layout_params: Dict) -> Tuple:
+    start_time = time.perf_counter()
+    canvas = procgen.generate_layout(rng=random.Random(seed), **layout_params)
+    generation_time = time.perf_counter() - start_time
+
+    walkable = tile_types.palette["walkable"][canvas.tiles]
+    return (
+        seed,
+        generation_time,
+        np.count_nonzero(walkable) / walkable.size,
+        len(canvas.rooms),
+        reachable_ratio(walkable, canvas.start),
+        count_dead_ends(walkable),
+        connectivity.label_regions(walkable)[1],
+    )
+
+def measure_batch(seeds: List[int], layout_params: Dict) -> List[Tuple]:
+    return [measure_floor(seed, layout_params) for seed in seeds]
+
+def run(count: int, base_seed: int, workers: int, layout_params: Dict, batch_size: int = 64) -> Dict[str, np.ndarray]:
+    seeds = [rng.stream_seed(base_seed, "floor", i) for i in range(count)]
+    batches = [seeds[i:i+batch_size] for i in range(0, count, batch_size)]
+
+    rows: List[Tuple] = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_rows in executor.map(measure_batch, batches, [layout_params]*len(batches)):
+            rows.extend(batch_rows)
+
+    columns = list(zip(*rows))
+    return {
+        "seed": np.array(columns[0], dtype=np.uint64),
+        "generation_time": np.array(columns[1], dtype=np.float64),
+        "floor_ratio": np.array(columns[2], dtype=np.float32),
+        "rooms": np.array(columns[3], dtype=np.int32),
+        "reachable_ratio": np.array(columns[4], dtype=np.float32),
+        "dead_ends": np.array(columns[5], dtype=np.int32),
+        "regions": np.array(columns[6], dtype=np.int32),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate floors in bulk and record quality metrics.")
+    parser.add_argument("--count", type=int, default=1000, help="number of floors to generate")
+    parser.add_argument("--seed", type=int, default=0, help="base seed, floor seeds are derived from it")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("--height", type=int, default=80)
+    parser.add_argument("--room-min-size", type=int, default=6)
+    parser.add_argument("--room-max-size", type=int, default=10)
+    parser.add_argument("--turn-prob", type=float, default=0.5)
+    parser.add_argument("--room-prob", type=float, default=0.2)
+    parser.add_argument("--branch-prob", type=float, default=0.2)
+    parser.add_argument("--generations", type=int, default=8)
+    parser.add_argument("--no-connect", action="store_true", help="skip joining disconnected regions")
+    parser.add_argument("--output", default="dungeon_stats.npz")
+    args = parser.parse_args()
+
+    layout_params = dict(
+        map_width=args.width,
+        map_height=args.height,
+        room_min_size=args.room_min_size,
+        room_max_size=args.room_max_size,
+        turn_prob=args.turn_prob,
+        room_prob=args.room_prob,
+        branch_prob=args.branch_prob,
+        number_generations=args.generations,
+        connect=not args.no_connect,
+    )
+
+    start_time = time.perf_counter()
+    results = run(count=args.count, base_seed=args.seed, workers=args.workers, layout_params=layout_params)
+    elapsed = time.perf_counter() - start_time
+
+    np.savez(args.output, **results, **{f"param_{key}": value for key, value in layout_params.items()})
+
+    print(f"Generated {args.count} floors in {elapsed:.2f}s, saved to {args.output}")
+    for column in COLUMNS[1:]:
+        values = results[column]
+        print(f"{column:>16}: mean {values.mean():10.4f}  std {values.std():10.4f}  min {values.min():10.4f}  max {values.max():10.4f}")
+
+if __name__ == "__main__":
+    main()
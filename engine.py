@@ -6,9 +6,10 @@ import math
 from typing import TYPE_CHECKING
 
 from tcod.console import Console
-from tcod.map import compute_fov
 
 import exceptions
+import lighting
+import rng
 from message_log import MessageLog
 from animations import Animation
 from render_functions import (
@@ -22,6 +23,7 @@ from render_functions import (
 
 if TYPE_CHECKING:
     from game_map import GameMap
+    from floor_manager import FloorManager
     from entity import Actor
     from card_suits import Suit
 
@@ -39,17 +41,22 @@ class Engine:
     status_x, status_y = border_width+viewport_width+viewport_x, border_width
     message_log_width, message_log_height = viewport_width, 4
     game_map: GameMap
+    floor_manager: FloorManager
     animations: List[Animation]
     card_highlighted = 0
     momentum: Tuple[int, List[Suit]]
     momentum_max = 1
+    fov_radius = 8
 
-    def __init__(self, player: Actor):
+    def __init__(self, player: Actor, seed: int):
+        self.seed = seed
+        self.rng = rng.make_random(seed, "gameplay")
         self.message_log = MessageLog()
         self.mouse_location = (0, 0)
         self.player = player
         self.animations = []
         self.momentum = (self.momentum_max, [])
+        self.player_light = lighting.LightMap()
 
     def mouse_in_rect(self, x: int, y: int, width: int, height: int) -> bool:
         mouse_x, mouse_y = self.mouse_location
@@ -61,7 +68,7 @@ class Engine:
 
     def gamemap_to_screen(self, game_x:int, game_y: int) -> Tuple[int, int]:
         shift_x, shift_y = self.game_map.get_map_shift(self.viewport_width-2, self.viewport_height-2)
-        return(game_x-shift_x+self.viewport_x-1, game_y-shift_y+self.viewport_y-1)
+        return(game_x-shift_x+self.viewport_x+1, game_y-shift_y+self.viewport_y+1)
 
     def save_as(self, filename:str) -> None:
         """Save this Engine instance as a compressed file"""
@@ -70,7 +77,13 @@ class Engine:
             f.write(save_data)
 
     def handle_enemy_turns(self) -> None:
-        for entity in set(self.game_map.actors) - {self.player}:
+        enemies = set(self.game_map.actors) - {self.player}
+        self.game_map.update_awareness(
+            self.player.x,
+            self.player.y,
+            radius=max((entity.sight_radius for entity in enemies), default=0)
+        )
+        for entity in enemies:
             if entity.ai:
                 try:
                     entity.ai.perform()
@@ -78,22 +91,24 @@ class Engine:
                     pass
 
     def update_fov(self) -> None:
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=8
-        )
-
-        self.game_map.explored |= self.game_map.visible
+        self.game_map.update_fov(self.player.x, self.player.y, self.fov_radius)
 
     def render(self, console: Console) -> None:
 
+        self.player_light.sources = [lighting.LightSource(
+            self.player.x,
+            self.player.y,
+            radius=self.fov_radius,
+            color=(255, 240, 200),
+            intensity=0.6
+        )]
         self.game_map.render(
             console,
             x=self.hand_width+(2*self.border_width)+1,
             y=self.border_width+1,
             width=self.viewport_width-2,
-            height=self.viewport_width-2)
+            height=self.viewport_width-2,
+            lights=[self.player_light])
 
         self.message_log.render(console=console,
             x=2*self.border_width+self.deck_stats_width,
@@ -1,70 +1,11 @@
-from components.ai import HostileEnemy, BansheeAI
-from components import consumable
-from components.fighter import Fighter
-from components.inventory import Inventory
-from components.card_zone import CardZone, Deck
-from components.level import Level
-from entity import Actor, Item
-import cards_factory
-import copy
+'''
+Prototypes of the player, monsters and items, compiled from assets/data/entities.json
+the first time each is used, eg. entities_factory.orc.spawn(dungeon, x, y)
+'''
 
-player = Actor(
-    char="@",
-    color=(255,255,255),
-    name="Player",
-    ai_cls=HostileEnemy,
-    fighter=Fighter(hp=30, defense=2, power=5),
-    inventory=Inventory(capacity=26),
-    level=Level(level_up_base=200),
-    card_handler=(
-        Deck(cards_factory.starter_deck),
-        CardZone(),
-        CardZone())
-    )
+import content
 
-orc = Actor(
-    char="o",
-    color=(63,127,63),
-    name="Orc",
-    ai_cls=BansheeAI,
-    fighter=Fighter(hp=10, defense=0, power=3),
-    inventory=Inventory(capacity=0),
-    level=Level(xp_given=35)
-    )
-troll = Actor(
-    char="T",
-    color=(0,127,0),
-    name="Troll",
-    ai_cls=HostileEnemy,
-    fighter=Fighter(hp=16, defense=1, power=4),
-    inventory=Inventory(capacity=0),
-    level=Level(xp_given=100)
-    )
-
-confusion_scroll = Item(
-    char="~",
-    color=(207, 63, 255),
-    name="Confusion Scroll",
-    consumable=consumable.ConfusionConsumable(number_of_turns=10)
-)
-
-fireball_scroll = Item(
-    char="~",
-    color=(255, 0, 0),
-    name="Fireball Scroll",
-    consumable=consumable.FireballDamageConsumable(damage=12, radius=3)
-)
-
-health_potion = Item(
-    char="!",
-    color=(127, 0, 255),
-    name="Health Potion",
-    consumable=consumable.HealingConsumable(amount=4)
-)
-
-lightning_scroll = Item(
-    char="~",
-    color=(255, 255, 0),
-    name="Lightning Scroll",
-    consumable=consumable.LightningDamageConsumable(damage=20, maximum_range=5)
-)
+def __getattr__(name: str):
+    if name.startswith("__") or name not in content.entities:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return content.entities.get(name)
@@ -2,8 +2,10 @@ from __future__ import annotations
 
 import copy
 import math
-from typing import Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union
+import sys
+from typing import Dict, Iterable, Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union
 
+import exceptions
 from render_order import RenderOrder
 from card_suits import Suit
 
@@ -15,11 +17,27 @@ if TYPE_CHECKING:
     from game_map import GameMap
     from components.card_zone import CardZone, Deck
     from components.level import Level
-    from card_effects import CardEffect
+    from components.card_effects import CardEffect
+    from input_handler import ActionOrHandler
+    import numpy as np
 
 T = TypeVar("T", bound="Entity")
 
+Color = Tuple[int, int, int]
+
+_colors: Dict[Color, Color] = {}
+
+def intern_color(color: Iterable[int]) -> Color:
+    """One shared tuple per distinct color, like sys.intern for strings"""
+    color = tuple(color)
+    return _colors.setdefault(color, color)
+
 class Entity:
+    """
+    Entities and their components use __slots__, and names and colors are interned, so
+    a monster costs a few small objects whose strings and tuples are shared with its kind.
+    """
+    __slots__ = ("parent", "x", "y", "char", "color", "name", "blocks_movement", "render_order")
 
     parent: Union[GameMap, Inventory, CardZone]
 
@@ -36,15 +54,24 @@ class Entity:
     ):
         self.x = x
         self.y = y
-        self.char = char
-        self.color = color
-        self.name = name
+        self.char = sys.intern(char)
+        self.color = intern_color(color)
+        self.name = sys.intern(name)
         self.blocks_movement = blocks_movement
         self.render_order = render_order
         if parent:
             self.parent=parent
             parent.entities.add(self)
 
+    def __setstate__(self, state: Tuple[Optional[dict], Dict[str, object]]) -> None:
+        """Unpickled and copied entities share interned names and colors again"""
+        for name, value in state[1].items():
+            if name in ("char", "name"):
+                value = sys.intern(value)
+            elif name == "color":
+                value = intern_color(value)
+            setattr(self, name, value)
+
     @property
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
@@ -75,6 +102,8 @@ class Entity:
         self.y += dy
 
 class Actor(Entity):
+    __slots__ = ("ai", "sight_radius", "fighter", "inventory", "level", "deck", "hand", "discard")
+
     def __init__(
         self,
         *,
@@ -88,6 +117,7 @@ class Actor(Entity):
         inventory: Inventory,
         level: Level,
         card_handler: Optional[Tuple[Deck, CardZone, CardZone]] = None,
+        sight_radius: int = 8,
     ):
         super().__init__(
             x=x,
@@ -100,6 +130,7 @@ class Actor(Entity):
         )
 
         self.ai: Optional[BaseAI] = ai_cls(self)
+        self.sight_radius = sight_radius
 
         self.fighter = fighter
         self.fighter.parent = self
@@ -115,14 +146,14 @@ class Actor(Entity):
                 zone.parent = self
             self.deck, self.hand, self.discard = card_handler
             self.deck.link_discard(self.discard)
-            self.deck.shuffle()
-            self.deck.draw_to_zone(zone=self.hand, number_of_cards=5)
 
     @property
     def is_alive(self) -> bool:
         return bool(self.ai)
 
 class Item(Entity):
+    __slots__ = ("consumable",)
+
     def __init__(
         self,
         *,
@@ -146,43 +177,109 @@ class Item(Entity):
         self.consumable = consumable
         self.consumable.parent = self
 
-class Card(Entity):
+card_definitions: Dict[str, CardDefinition] = {}
+
+def get_card_definition(key: str) -> CardDefinition:
+    """Definitions that haven't been used yet in this session are compiled from the content registry"""
+    if key not in card_definitions:
+        import content
+        content.cards.get(key)
+    return card_definitions[key]
+
+class CardDefinition:
+    """
+    What a card is, shared by every copy of it: the effect holds only parameters, and is handed
+    the card and its user when played. Definitions are registered by key on creation and
+    pickle as that key, so saves store each card as a short reference.
+    """
+    __slots__ = ("key", "char", "color", "name", "text", "effect", "suits")
+
     def __init__(
         self,
         *,
-        char = "?",
+        key: str,
+        char: str = "?",
         color: Tuple[int, int, int] = (255, 255, 255),
         name: str = "<Unnamed>",
         text: str = "<None>",
         effect: CardEffect,
-        suits: List[Suit],
-        parent: Optional[CardZone] = None
+        suits: Iterable[Suit]
     ):
-        super().__init__(
-            char=char,
-            name=name,
-            color=color,
-            render_order=RenderOrder.ITEM
-        )
-        self.text = text
-        self.effect = effect
-        self.effect.parent = self
-        self.suits=suits
-        self.deck: Optional[Deck] = None
+        for attribute, value in (
+            ("key", key),
+            ("char", char),
+            ("color", tuple(color)),
+            ("name", name),
+            ("text", text),
+            ("effect", effect),
+            ("suits", tuple(suits)),
+        ):
+            object.__setattr__(self, attribute, value)
+        card_definitions[key] = self
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (get_card_definition, (self.key,))
+
+class Card:
+    """
+    A copy of a card in play: a handle on its definition, the zone it is in (parent) and the deck it belongs to.
+    Cards never stand on the map, so they aren't entities.
+    """
+    __slots__ = ("definition", "parent", "deck", "targets_key", "targets")
+
+    def __init__(self, definition: CardDefinition, parent: Optional[CardZone] = None):
+        self.definition = definition
         self.parent = parent
+        self.deck: Optional[Deck] = None
+        # Cache of CardEffect.valid_targets, kept here as the effect is shared
+        self.targets_key: Optional[Tuple] = None
+        self.targets: Optional[np.ndarray] = None
+
+    @property
+    def char(self) -> str:
+        return self.definition.char
+
+    @property
+    def color(self) -> Tuple[int, int, int]:
+        return self.definition.color
+
+    @property
+    def name(self) -> str:
+        return self.definition.name
+
+    @property
+    def text(self) -> str:
+        return self.definition.text
+
+    @property
+    def effect(self) -> CardEffect:
+        return self.definition.effect
+
+    @property
+    def suits(self) -> Tuple[Suit, ...]:
+        return self.definition.suits
 
     @property
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
 
+    def get_action(self, user: Actor) -> Optional[ActionOrHandler]:
+        return self.effect.get_action(self, user)
+
+    def valid_targets(self, user: Actor) -> np.ndarray:
+        return self.effect.valid_targets(self, user)
+
     def duplicate(self) -> Card:
-        return copy.deepcopy(self)
+        return Card(self.definition)
 
     def return_to_deck(self) -> None:
         if self.deck:
             self.deck.add_card(self)
         else:
-            raise Impossible(f"{self.name} has no deck defined!")
+            raise exceptions.Impossible(f"{self.name} has no deck defined!")
 
     def add_to_deck(self, deck: Deck) -> None:
         self.deck = deck
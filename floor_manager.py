@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import io
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import traceback
+import weakref
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Optional, TYPE_CHECKING
+
+from procgen import build_floor
+import rng
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from game_map import GameMap
+
+class _FloorPickler(pickle.Pickler):
+    """Pickles a floor without dragging the engine (and the rest of the run) along with it"""
+
+    def __init__(self, file: io.BytesIO, engine: Engine):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.engine = engine
+
+    def persistent_id(self, obj: Any) -> Optional[str]:
+        if obj is self.engine:
+            return "engine"
+        return None
+
+class _FloorUnpickler(pickle.Unpickler):
+    def __init__(self, file: io.BytesIO, engine: Engine):
+        super().__init__(file)
+        self.engine = engine
+
+    def persistent_load(self, pid: str) -> Any:
+        if pid == "engine":
+            return self.engine
+        raise pickle.UnpicklingError(f"Unknown persistent id {pid!r}")
+
+class FloorCache:
+    """
+    LRU of compressed floors, keyed by depth.
+    Floors past the capacity are spilled to a temporary directory of this cache's own, coldest first,
+    under spill_root or the system's temporary directory. Saves carry the spilled floors inside them,
+    so the directory only matters while the run is being played. It is removed with discard, or when
+    the cache is collected, and no other directory is ever touched, so games running side by side are safe.
+    """
+    def __init__(self, engine: Engine, capacity: int = 4, spill_root: Optional[str] = None):
+        self.engine = engine
+        self.capacity = capacity
+        self.spill_root = spill_root
+        self.spill_dir: Optional[str] = None
+        self.compressed: OrderedDict[int, bytes] = OrderedDict()
+        self.spilled: Dict[int, str] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state.pop("_remove_spill_dir", None)
+        state["spilled"] = {}
+        state["spilled_data"] = {depth: self.read_spilled(depth) for depth in self.spilled}
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        spilled_data = state.pop("spilled_data")
+        self.__dict__.update(state)
+        # Every loaded save spills to a new directory, so loading the same save twice is safe
+        self.spill_dir = None
+        for depth, data in spilled_data.items():
+            self.spill(depth, data)
+
+    def make_spill_dir(self) -> str:
+        """A new directory of this cache's own, removed along with the cache"""
+        self.spill_dir = tempfile.mkdtemp(prefix="floors-", dir=self.spill_root)
+        self._remove_spill_dir = weakref.finalize(self, shutil.rmtree, self.spill_dir, ignore_errors=True)
+        return self.spill_dir
+
+    def discard(self) -> None:
+        if self.spill_dir is not None:
+            self._remove_spill_dir()
+            self.spill_dir = None
+        self.spilled.clear()
+
+    def __contains__(self, depth: int) -> bool:
+        return depth in self.compressed or depth in self.spilled
+
+    def compress(self, game_map: GameMap) -> bytes:
+        buffer = io.BytesIO()
+        _FloorPickler(buffer, self.engine).dump(game_map)
+        return zlib.compress(buffer.getvalue())
+
+    def decompress(self, data: bytes) -> GameMap:
+        return _FloorUnpickler(io.BytesIO(zlib.decompress(data)), self.engine).load()
+
+    def store(self, game_map: GameMap) -> None:
+        self.compressed[game_map.depth] = self.compress(game_map)
+        self.compressed.move_to_end(game_map.depth)
+        while len(self.compressed) > self.capacity:
+            depth, data = self.compressed.popitem(last=False)
+            self.spill(depth, data)
+
+    def spill(self, depth: int, data: bytes) -> None:
+        path = os.path.join(self.spill_dir or self.make_spill_dir(), f"{depth}.floor")
+        with open(path, "wb") as f:
+            f.write(data)
+        self.spilled[depth] = path
+
+    def read_spilled(self, depth: int) -> bytes:
+        with open(self.spilled[depth], "rb") as f:
+            return f.read()
+
+    def load(self, depth: int) -> GameMap:
+        """Remove a floor from the cache and return it"""
+        if depth in self.compressed:
+            data = self.compressed.pop(depth)
+        else:
+            data = self.read_spilled(depth)
+            os.remove(self.spilled.pop(depth))
+        return self.decompress(data)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def get_executor() -> ProcessPoolExecutor:
+    """Single worker process shared by every FloorManager, started on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=1)
+    return _executor
+
+def floor_seed(run_seed: int, depth: int) -> int:
+    return rng.stream_seed(run_seed, "floor", depth)
+
+def build_floor_from_seed(floor_params: Dict[str, int], seed: int, depth: int, fov_radius: int) -> GameMap:
+    return build_floor(depth=depth, rng=random.Random(seed), fov_radius=fov_radius, **floor_params)
+
+def prefetch_floor(floor_params: Dict[str, int], run_seed: int, depth: int, fov_radius: int) -> Future:
+    """Start building a floor on the worker process"""
+    return get_executor().submit(
+        build_floor_from_seed, floor_params, floor_seed(run_seed, depth), depth, fov_radius
+    )
+
+class FloorManager:
+    """
+    Owns every floor of the run.
+    The active floor lives on engine.game_map, visited floors are kept in a FloorCache.
+    The floor below the deepest one visited is built ahead of time on a worker process.
+    """
+    def __init__(self, engine: Engine, floor_params: Dict[str, int], max_cached_floors: int = 4):
+        self.engine = engine
+        self.floor_params = floor_params
+        self.current_depth = 0
+        self.deepest_depth = 0
+        self.cache = FloorCache(engine, capacity=max_cached_floors)
+        self.pending: Dict[int, Future] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["pending"] = {}
+        return state
+
+    def floor_seed(self, depth: int) -> int:
+        return floor_seed(self.engine.seed, depth)
+
+    def discard(self) -> None:
+        """Drop the files of this run, once it has been saved or is over"""
+        self.cache.discard()
+
+    def prefetch(self, depth: int, future: Optional[Future] = None) -> None:
+        """Build a floor in the background, or adopt a build that was already started"""
+        if depth in self.cache or depth in self.pending:
+            return
+        if future is None:
+            future = prefetch_floor(self.floor_params, self.engine.seed, depth, self.engine.fov_radius)
+        self.pending[depth] = future
+
+    def generate_floor(self, depth: int) -> GameMap:
+        future = self.pending.pop(depth, None)
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                traceback.print_exc()
+        return build_floor_from_seed(self.floor_params, self.floor_seed(depth), depth, self.engine.fov_radius)
+
+    def change_floor(self, depth: int) -> None:
+        previous_map = getattr(self.engine, "game_map", None)
+        player = self.engine.player
+
+        if depth in self.cache:
+            game_map = self.cache.load(depth)
+            if depth > self.current_depth:
+                player.place(*game_map.upstairs_location, game_map)
+            else:
+                player.place(*game_map.downstairs_location, game_map)
+            update_fov = True
+        else:
+            game_map = self.generate_floor(depth)
+            game_map.engine = self.engine
+            player.place(*game_map.start_location, game_map)
+            update_fov = False
+
+        self.engine.game_map = game_map
+        self.current_depth = depth
+        self.deepest_depth = max(self.deepest_depth, depth)
+
+        if previous_map is not None:
+            self.cache.store(previous_map)
+
+        if update_fov:
+            self.engine.update_fov()
+
+        self.prefetch(self.deepest_depth + 1)
+
+    def descend(self) -> None:
+        self.change_floor(self.current_depth + 1)
+
+    def ascend(self) -> None:
+        self.change_floor(self.current_depth - 1)
@@ -1,34 +1,94 @@
 from __future__ import annotations
 
-from typing import Iterable, Iterator, Optional, TYPE_CHECKING
+from typing import Dict, Iterable, Iterator, Optional, Tuple, TYPE_CHECKING
 
 import numpy as np  # type: ignore
 from tcod.console import Console
+import tcod
+from tcod.map import compute_fov
 
 from entity import Actor, Item
 import tile_types
 import icons
+import lighting
 
 if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
 
 class GameMap:
-    def __init__(self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()):
+    def __init__(self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = (), depth: int = 1):
         self.engine = engine
         self.width = width
         self.height = height
         self.entities = set(entities)
+        self.depth = depth
 
-        self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
+        self.start_location: Tuple[int, int] = (width//2, height//2)
+        self.downstairs_location: Optional[Tuple[int, int]] = None
+        self.upstairs_location: Optional[Tuple[int, int]] = None
+
+        # Indices into tile_types.palette, read the tile properties through walkable, transparent, light and dark
+        # Writes should go through set_tiles so the cached planes are rebuilt
+        self.tiles = np.full((width, height), fill_value=tile_types.WALL, dtype=np.uint8, order="F")
+        self.tiles_version = 0
+        self._planes: Dict[str, np.ndarray] = {}
 
         self.visible = np.full((width, height), fill_value=False, order="F")
         self.explored = np.full((width, height), fill_value=False, order="F")
+        # (x, y, radius, tiles_version) visible was last computed for, and the window it covers
+        self._fov_key: Optional[Tuple[int, int, int, int]] = None
+        self._fov_window: Tuple[slice, slice] = (slice(0, 0), slice(0, 0))
+        self.reset_awareness()
+        self.static_lights = lighting.LightMap()
 
     @property
     def gamemap(self) -> GameMap:
         return self
 
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_planes"] = {}
+        return state
+
+    def set_tiles(self, index, tile_id) -> None:
+        """Write tile ids, eg. set_tiles((x, y), tile_types.FLOOR) or set_tiles(slice(None), canvas.tiles)"""
+        self.tiles[index] = tile_id
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Must be called after writing to tiles directly"""
+        self.tiles_version += 1
+        self._planes.clear()
+
+    def plane(self, name: str) -> np.ndarray:
+        """
+        Read-only contiguous plane of a tile_dt field, cached until the tiles change.
+        Copy it before modifying.
+        """
+        plane = self._planes.get(name)
+        if plane is None:
+            plane = tile_types.palette[name][self.tiles]
+            plane.flags.writeable = False
+            self._planes[name] = plane
+        return plane
+
+    @property
+    def walkable(self) -> np.ndarray:
+        return self.plane("walkable")
+
+    @property
+    def transparent(self) -> np.ndarray:
+        return self.plane("transparent")
+
+    @property
+    def light(self) -> np.ndarray:
+        return self.plane("light")
+
+    @property
+    def dark(self) -> np.ndarray:
+        return self.plane("dark")
+
     @property
     def actors(self) -> Iterator[Actor]:
         yield from (
@@ -86,28 +146,108 @@ class GameMap:
     def in_bounds(self, x: int, y: int) -> bool:
         return 0 <= x < self.width and 0 <= y < self.height
 
-    def render(self, console: Console, x: int, y: int, width: int, height: int) -> None:
+    def fov_window(self, x: int, y: int, radius: int) -> Tuple[slice, slice]:
+        """The tiles within radius of (x, y), clipped to the map"""
+        return (
+            slice(max(0, x - radius), min(self.width, x + radius + 1)),
+            slice(max(0, y - radius), min(self.height, y + radius + 1))
+        )
+
+    @property
+    def fov_key(self) -> Optional[Tuple[int, int, int, int]]:
+        """(x, y, radius, tiles_version) of the current field of view, it changes whenever visible does"""
+        return self._fov_key
+
+    def update_fov(self, x: int, y: int, radius: int) -> None:
+        """
+        Recompute visible only when the origin, radius or tiles have changed since the last call,
+        and only over the window the radius can reach, so the cost doesn't depend on the map size
+        """
+        key = (x, y, radius, self.tiles_version)
+        if key == self._fov_key:
+            return
+        self._fov_key = key
+
+        self.visible[self._fov_window] = False
+        window = self.fov_window(x, y, radius)
+        visible = compute_fov(self.transparent[window], (x - window[0].start, y - window[1].start), radius=radius)
+        self.visible[window] = visible
+        self.explored[window] |= visible
+        self._fov_window = window
+
+    def reset_awareness(self) -> None:
+        self._awareness_key: Optional[Tuple[int, int, int, int]] = None
+        self._awareness = np.zeros((0, 0), dtype=bool)
+        self._awareness_window: Tuple[slice, slice] = (slice(0, 0), slice(0, 0))
+
+    def update_awareness(self, x: int, y: int, radius: int) -> None:
+        """
+        Find every tile with line of sight to (x, y) within radius, for can_see_target.
+        Symmetric shadowcasting makes that a single field of view out of (x, y), shared by all monsters.
+        """
+        key = (x, y, radius, self.tiles_version)
+        if key == self._awareness_key:
+            return
+        self._awareness_key = key
+        # Shadowcasting only lights tiles strictly inside its radius, one more covers the ring at radius
+        window = self.fov_window(x, y, radius + 1)
+        self._awareness = compute_fov(
+            self.transparent[window],
+            (x - window[0].start, y - window[1].start),
+            radius=radius + 1,
+            algorithm=tcod.libtcodpy.FOV_SYMMETRIC_SHADOWCAST
+        )
+        self._awareness_window = window
+
+    def can_see_target(self, actor: Actor) -> bool:
+        """True if the actor has line of sight to the point of the last update_awareness, within its sight radius inclusive"""
+        if self._awareness_key is None:
+            return False
+        target_x, target_y = self._awareness_key[:2]
+        dx, dy = actor.x - target_x, actor.y - target_y
+        if dx*dx + dy*dy > actor.sight_radius*actor.sight_radius:
+            return False
+        x, y = actor.x - self._awareness_window[0].start, actor.y - self._awareness_window[1].start
+        width, height = self._awareness.shape
+        return 0 <= x < width and 0 <= y < height and bool(self._awareness[x, y])
+
+    def render(
+        self,
+        console: Console,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        lights: Iterable[lighting.LightMap] = ()
+    ) -> None:
+        """Draw the map around the player lit by the floor's static lights and the given dynamic ones"""
         '''
         viewmap = np.select(
             condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
+            choicelist=[self.light, self.dark],
             default=tile_types.SHROUD
         )
         '''
-        viewmap = self.tiles["light"]
-        viewslice = self.get_centered_map_slice(width=width, height=height, map=viewmap)
-        console.tiles_rgb[x:(x+width), y:(y+height)] = viewslice
+        viewslice = self.get_centered_map_slice(width=width, height=height, map=self.tiles)
+        shift_x, shift_y = self.get_map_shift(width=width, height=height)
+        graphics = tile_types.palette["light"][viewslice]
+        lighting.composite(
+            graphics,
+            shift_x,
+            shift_y,
+            [self.static_lights.get(self)] + [light_map.get(self) for light_map in lights]
+        )
+        console.tiles_rgb[x:(x+width), y:(y+height)] = graphics
 
         entities_sorted_for_rendering = sorted(self.entities, key=lambda x: x.render_order.value)
-
-        shift_x, shift_y = self.get_map_shift(width=width, height=height)
+        transparent = self.transparent
 
         for actor in self.actors:
             attack_pattern = actor.ai.get_attack()
             if attack_pattern and self.visible[actor.x, actor.y]:
                 for tile in attack_pattern.get_tile_list():
                     tile_x, tile_y = tile
-                    if self.explored[tile_x, tile_y] and self.tiles[tile_x, tile_y]["transparent"]:
+                    if self.explored[tile_x, tile_y] and transparent[tile_x, tile_y]:
                         console.print(
                             x=x+tile_x-shift_x,
                             y=y+tile_y-shift_y,
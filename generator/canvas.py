@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from generator.generator_tools import Directions
+import tile_types
+
+if TYPE_CHECKING:
+    from game_map import GameMap
+    from procgen import RectangularRoom
+
+class Canvas:
+    """
+    Scratch map the dungeon generators carve into.
+    Cells are uint8 indices into tile_types.palette, so footprint checks and carving
+    are plain slice operations. The result is written to a GameMap once, by materialize.
+
+    Writes should go through set_tile/fill_rect/write_masked, which patch the summed-area table
+    of the wall mask and the door site planes in place: only the entries after the written
+    rectangle change, so placing a room doesn't cost a rebuild of the whole canvas.
+    Direct writes to tiles must be followed by invalidate, which rebuilds them on the next query.
+    """
+    def __init__(self, width: int, height: int, fill: int = tile_types.WALL):
+        self.width = width
+        self.height = height
+        self.tiles = np.full((width, height), fill_value=fill, dtype=np.uint8, order="F")
+        self.rooms: List[RectangularRoom] = []
+        self.start: Optional[Tuple[int, int]] = None
+        self.downstairs_location: Optional[Tuple[int, int]] = None
+        self.upstairs_location: Optional[Tuple[int, int]] = None
+        self.spawns: List[Tuple[int, int, str]] = []
+        self._wall_sat: Optional[np.ndarray] = None
+        self._door_planes: Optional[Dict[Directions, np.ndarray]] = None
+        self._door_sums: Optional[Dict[Directions, np.ndarray]] = None
+
+    def invalidate(self) -> None:
+        """Must be called after writing to tiles directly"""
+        self._wall_sat = None
+        self._door_planes = None
+        self._door_sums = None
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def rect_in_bounds(self, x1: int, y1: int, x2: int, y2: int) -> bool:
+        """Bounds are inclusive-exclusive, like slices"""
+        return 0 <= x1 and 0 <= y1 and x2 <= self.width and y2 <= self.height
+
+    def rect_is(self, x1: int, y1: int, x2: int, y2: int, tile_id: int) -> bool:
+        """True if the rectangle is in bounds and only contains tile_id"""
+        if not self.rect_in_bounds(x1, y1, x2, y2):
+            return False
+        if tile_id == tile_types.WALL:
+            return bool(self.rects_all_wall(x1, y1, x2, y2))
+        return bool(np.all(self.tiles[x1:x2, y1:y2] == tile_id))
+
+    def set_tile(self, x: int, y: int, tile_id: int) -> None:
+        self.fill_rect(x, y, x+1, y+1, tile_id)
+
+    def fill_rect(self, x1: int, y1: int, x2: int, y2: int, tile_id: int) -> None:
+        old = self.tiles[x1:x2, y1:y2].copy()
+        if not old.size:
+            return
+        self.tiles[x1:x2, y1:y2] = tile_id
+        width, height = old.shape
+        self.update_wall_sat(x1, y1, old)
+        self.update_doors(x1, y1, x1 + width, y1 + height)
+
+    def write_masked(self, x: int, y: int, tiles: ArrayLike, where: np.ndarray) -> None:
+        """Write tiles, a tile id or an array shaped like where, to the cells of where placed at (x, y)"""
+        width, height = where.shape
+        region = self.tiles[x:x+width, y:y+height]
+        old = region.copy()
+        np.copyto(region, tiles, where=where)
+        self.update_wall_sat(x, y, old)
+        self.update_doors(x, y, x + width, y + height)
+
+    def update_wall_sat(self, x1: int, y1: int, old: np.ndarray) -> None:
+        """Add the change in walls of the rectangle at (x1, y1), which held old, to the entries after it"""
+        sat = self._wall_sat
+        if sat is None:
+            return
+        width, height = old.shape
+        delta = (self.tiles[x1:x1+width, y1:y1+height] == tile_types.WALL).astype(np.int32) - (old == tile_types.WALL)
+        if not delta.any():
+            return
+        sums = np.zeros((width+1, height+1), dtype=np.int32)
+        np.cumsum(delta, axis=0, out=sums[1:, 1:])
+        np.cumsum(sums[1:, 1:], axis=1, out=sums[1:, 1:])
+        xs = np.minimum(np.arange(1, self.width - x1 + 1), width)
+        ys = np.minimum(np.arange(1, self.height - y1 + 1), height)
+        sat[x1+1:, y1+1:] += sums[np.ix_(xs, ys)]
+
+    def update_doors(self, x1: int, y1: int, x2: int, y2: int) -> None:
+        """Recompute the door planes a write to the rectangle can reach, and their sums from there on"""
+        if self._door_planes is None:
+            return
+        x1, y1 = max(x1-1, 0), max(y1-1, 0)
+        x2, y2 = min(x2+1, self.width), min(y2+1, self.height)
+        for direction, plane in self.compute_door_planes(x1, y1, x2, y2).items():
+            self._door_planes[direction][x1:x2, y1:y2] = plane
+        if self._door_sums is None:
+            return
+        for direction, sums in self._door_sums.items():
+            plane = self._door_planes[direction]
+            if direction in (Directions.N, Directions.S):
+                np.cumsum(plane[x1:, y1:y2], axis=0, dtype=np.int32, out=sums[x1+1:, y1:y2])
+                sums[x1+1:, y1:y2] += sums[x1, y1:y2]
+            else:
+                np.cumsum(plane[x1:x2, y1:], axis=1, dtype=np.int32, out=sums[x1:x2, y1+1:])
+                sums[x1:x2, y1+1:] += sums[x1:x2, y1, np.newaxis]
+
+    @property
+    def wall_sat(self) -> np.ndarray:
+        """
+        Summed-area table of the wall mask, padded with a leading row and column of zeros:
+        wall_sat[x, y] is the number of walls in tiles[:x, :y]
+        """
+        if self._wall_sat is None:
+            sat = np.zeros((self.width+1, self.height+1), dtype=np.int32)
+            np.cumsum(self.tiles == tile_types.WALL, axis=0, dtype=np.int32, out=sat[1:, 1:])
+            np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+            self._wall_sat = sat
+        return self._wall_sat
+
+    def rects_all_wall(self, x1: ArrayLike, y1: ArrayLike, x2: ArrayLike, y2: ArrayLike) -> np.ndarray:
+        """
+        Vectorized over rectangles, each given as inclusive-exclusive bounds.
+        Rectangles that leave the canvas are never all wall.
+        """
+        x1, y1, x2, y2 = (np.asarray(bound) for bound in (x1, y1, x2, y2))
+        inside = (x1 >= 0) & (y1 >= 0) & (x2 <= self.width) & (y2 <= self.height) & (x1 < x2) & (y1 < y2)
+        x1, x2 = np.clip(x1, 0, self.width), np.clip(x2, 0, self.width)
+        y1, y2 = np.clip(y1, 0, self.height), np.clip(y2, 0, self.height)
+        sat = self.wall_sat
+        walls = sat[x2, y2] - sat[x1, y2] - sat[x2, y1] + sat[x1, y1]
+        return inside & (walls == (x2 - x1) * (y2 - y1))
+
+    @property
+    def door_planes(self) -> Dict[Directions, np.ndarray]:
+        """
+        For each direction, where a wall has floor directly beyond it in that direction.
+        Those are the door sites on the matching side of a room, eg. door_planes[Directions.N]
+        marks sites on the top wall of a room that lead north into existing floor.
+        """
+        if self._door_planes is None:
+            self._door_planes = self.compute_door_planes(0, 0, self.width, self.height)
+        return self._door_planes
+
+    def compute_door_planes(self, x1: int, y1: int, x2: int, y2: int) -> Dict[Directions, np.ndarray]:
+        """door_planes over the rectangle only"""
+        wall = self.tiles[x1:x2, y1:y2] == tile_types.WALL
+        width, height = wall.shape
+        # Floor of the rectangle and a one tile border, the border is False outside the canvas
+        floor = np.zeros((width+2, height+2), dtype=bool)
+        fx1, fy1 = max(x1-1, 0), max(y1-1, 0)
+        fx2, fy2 = min(x2+1, self.width), min(y2+1, self.height)
+        floor[fx1-x1+1:fx2-x1+1, fy1-y1+1:fy2-y1+1] = self.tiles[fx1:fx2, fy1:fy2] == tile_types.FLOOR
+        planes = {}
+        for direction in Directions:
+            dx, dy = direction.to_delta()
+            beyond = floor[1+dx:width+1+dx, 1+dy:height+1+dy]
+            planes[direction] = wall & beyond
+        return planes
+
+    @property
+    def door_sums(self) -> Dict[Directions, np.ndarray]:
+        """
+        Prefix sums of the door planes along the room side they belong to,
+        along x for N/S and along y for E/W, padded with a leading zero
+        """
+        if self._door_sums is None:
+            self._door_sums = {}
+            for direction, plane in self.door_planes.items():
+                axis = 0 if direction in (Directions.N, Directions.S) else 1
+                padding = ((1, 0), (0, 0)) if axis == 0 else ((0, 0), (1, 0))
+                self._door_sums[direction] = np.pad(np.cumsum(plane, axis=axis, dtype=np.int32), padding)
+        return self._door_sums
+
+    def rects_have_door_site(self, x1: ArrayLike, y1: ArrayLike, x2: ArrayLike, y2: ArrayLike) -> np.ndarray:
+        """
+        Vectorized over room interiors, given as inclusive-exclusive bounds at least two tiles inside the canvas.
+        True where some wall tile around the room has floor directly beyond it.
+        """
+        x1, y1, x2, y2 = (np.asarray(bound) for bound in (x1, y1, x2, y2))
+        sums = self.door_sums
+        top = sums[Directions.N][x2, y1-1] - sums[Directions.N][x1, y1-1]
+        bottom = sums[Directions.S][x2, y2] - sums[Directions.S][x1, y2]
+        left = sums[Directions.W][x1-1, y2] - sums[Directions.W][x1-1, y1]
+        right = sums[Directions.E][x2, y2] - sums[Directions.E][x2, y1]
+        return (top + bottom + left + right) > 0
+
+    def door_sites(self, rooms: Iterable[RectangularRoom]) -> List[List[Tuple[int, int]]]:
+        """
+        Door sites for each room, top/bottom pairs along x followed by left/right pairs along y.
+        Each room is a handful of slices of the door planes.
+        """
+        planes = self.door_planes
+        sites = []
+        for room in rooms:
+            xs, ys = np.arange(room.x1, room.x2), np.arange(room.y1, room.y2)
+            horizontal_x = np.repeat(xs, 2)
+            horizontal_y = np.tile([room.y1-1, room.y2], len(xs))
+            horizontal_ok = np.stack([
+                planes[Directions.N][room.x1:room.x2, room.y1-1],
+                planes[Directions.S][room.x1:room.x2, room.y2]
+            ], axis=1).ravel()
+            vertical_x = np.tile([room.x1-1, room.x2], len(ys))
+            vertical_y = np.repeat(ys, 2)
+            vertical_ok = np.stack([
+                planes[Directions.W][room.x1-1, room.y1:room.y2],
+                planes[Directions.E][room.x2, room.y1:room.y2]
+            ], axis=1).ravel()
+            site_x = np.concatenate([horizontal_x[horizontal_ok], vertical_x[vertical_ok]])
+            site_y = np.concatenate([horizontal_y[horizontal_ok], vertical_y[vertical_ok]])
+            sites.append(list(zip(site_x.tolist(), site_y.tolist())))
+        return sites
+
+    @property
+    def walkable(self) -> np.ndarray:
+        return tile_types.palette["walkable"][self.tiles]
+
+    def materialize(self, game_map: GameMap) -> None:
+        game_map.set_tiles(slice(None), self.tiles)
+        game_map.start_location = self.start
+        game_map.downstairs_location = self.downstairs_location
+        game_map.upstairs_location = self.upstairs_location
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from typing import List, Tuple, TYPE_CHECKING
+
+import numpy as np
+import tcod
+
+import tile_types
+
+if TYPE_CHECKING:
+    from generator.canvas import Canvas
+
+'''
+Connected components of the walkable plane, found by flooding one region at a time
+with tcod's dijkstra2d, so each region costs a single pass in C.
+Regions are 8-connected, matching the diagonal movement of the player and monsters.
+'''
+
+def label_regions(walkable: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    Label each walkable tile with its region, numbered from 1 in the order their first tile is found.
+    Unwalkable tiles are labelled 0.
+    """
+    labels = np.zeros(walkable.shape, dtype=np.int32, order="F")
+    cost = walkable.astype(np.int8)
+    unreached = np.iinfo(np.int32).max
+    remaining = walkable.copy()
+    count = 0
+    while remaining.any():
+        count += 1
+        seed = np.unravel_index(np.argmax(remaining), remaining.shape)
+        distance = tcod.path.maxarray(walkable.shape, order="F")
+        distance[seed] = 0
+        tcod.path.dijkstra2d(distance, cost, 1, 1, out=distance)
+        region = distance != unreached
+        labels[region] = count
+        remaining &= ~region
+    return labels, count
+
+def region_sizes(labels: np.ndarray, count: int) -> np.ndarray:
+    """Number of tiles in each region, indexed by label-1"""
+    return np.bincount(labels.ravel(), minlength=count+1)[1:]
+
+def connect_regions(canvas: Canvas) -> int:
+    """
+    Join every region to the one containing canvas.start by carving floor along the shortest
+    cardinal path through wall, never touching the outer border. Returns the number of regions
+    that were disconnected before carving.
+    """
+    labels, count = label_regions(canvas.walkable)
+    if count <= 1:
+        return count
+
+    connected = labels == labels[canvas.start]
+    unconnected = (labels > 0) & ~connected
+
+    cost = np.ones((canvas.width, canvas.height), dtype=np.int8, order="F")
+    cost[[0, -1], :] = 0
+    cost[:, [0, -1]] = 0
+
+    while unconnected.any():
+        distance = tcod.path.maxarray(cost.shape, order="F")
+        distance[connected] = 0
+        tcod.path.dijkstra2d(distance, cost, 1, 0, out=distance)
+
+        nearest = np.where(unconnected, distance, np.iinfo(distance.dtype).max)
+        target = np.unravel_index(np.argmin(nearest), nearest.shape)
+        corridor = tcod.path.hillclimb2d(distance, target, True, False)
+        xs, ys = corridor[:, 0], corridor[:, 1]
+
+        carved = canvas.tiles[xs, ys] == tile_types.WALL
+        canvas.tiles[xs[carved], ys[carved]] = tile_types.FLOOR
+
+        crossed = np.unique(labels[xs, ys])
+        connected |= np.isin(labels, crossed[crossed > 0])
+        connected[xs, ys] = True
+        unconnected &= ~connected
+
+    canvas.invalidate()
+    return count
+
+def disconnected_regions(canvas: Canvas) -> List[np.ndarray]:
+    """Masks of the walkable regions that can't be reached from canvas.start"""
+    labels, count = label_regions(canvas.walkable)
+    start_label = labels[canvas.start]
+    return [labels == label for label in range(1, count+1) if label != start_label]
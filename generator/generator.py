@@ -1,118 +1,209 @@
 import xml.etree.ElementTree as ET
 
 import random
+from typing import List, Optional, Tuple
 
-from xp_loader import load_xp_string
-from game_map import GameMap
-from generator.prefab import Prefab
+import numpy as np
 
+from game_map import GameMap
+from generator.canvas import Canvas
+from generator import connectivity
+from generator.prefab import Connector, Prefab
+from generator.prefab_cache import PrefabCache
+import entities_factory
+import procgen
 import tile_types
 
 '''
-Add support for value ranges in xml eg. rooms=10-20 -> min_rooms=10, max_rooms=20
-Add support for multiple starts, ensure connectivity
+Add support for multiple starts
 '''
 
+def parse_range(value: str) -> Tuple[int, int]:
+    """Reads "min-max" or a single "value" from the xml"""
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
 class Generator:
-    def __init__(self, filepath, engine):
-        self.engine = engine
-        self.prefabs = []
-        self.weights = []
-        self.open_connectors = []
-        self.map = None
+    def __init__(self, filepath, rng: random.Random, prefab_cache: Optional[PrefabCache] = None):
+        self.rng = rng
+        self.prefab_cache = prefab_cache if prefab_cache else PrefabCache()
+        self.prefabs: List[Prefab] = []
+        self.weights: List[float] = []
+        self.start_rooms: List[Prefab] = []
+        self.start_weights: List[float] = []
+        self.open_connectors: List[Connector] = []
+        self.canvas: Optional[Canvas] = None
         self.min_rooms = 0
         self.max_rooms = 0
+        self.max_attempts = 100
         self.load_config(filepath)
 
-    def generate(self):
-        start = random.choice(self.start_rooms)
-        x = random.randint(self.min_start_x, self.max_start_x)
-        y = random.randint(self.min_start_y, self.max_start_y)
-        start.place(x, y, self.map)
-        self.open_connectors += start.translate_connectors(x, y)
+    def generate(self) -> Canvas:
+        """Generate until a layout meets min_rooms, see generate_attempt"""
+        for attempt in range(self.max_attempts):
+            if self.generate_attempt():
+                return self.canvas
+        raise RuntimeError(f"Could not place {self.min_rooms} rooms in {self.max_attempts} attempts")
+
+    def generate_attempt(self) -> bool:
+        self.canvas = Canvas(self.width, self.height)
+        self.open_connectors = []
+
+        start = self.rng.choices(self.start_rooms, weights=self.start_weights)[0]
+        x = self.rng.randint(self.min_start_x, self.max_start_x)
+        y = self.rng.randint(self.min_start_y, self.max_start_y)
+        self.commit(start, x, y)
+        self.canvas.start = (x + start.width//2, y + start.height//2)
         self.placed_rooms = 1
-        for i in range(max_rooms-1):
-            room = random.choice(self.prefabs)
-            start_connector = random.choice(self.open_connectors)
-            start_x, start_y = start_connector[0]
-            end_connector = room.get_connector_facing(start_connector[1].flip())
-            end_x, end_y = end_connector[0]
-            dx, dy = start_connector[1].to_delta()
-            for length in range(0, self.max_connector_length+1, -1):
-                if room.check_match(start_x + dx*length - end_x, start_y + dy*length - end_y, self.map):
-                    room.place(start_x + dx*length - end_x, start_y + dy*length - end_y, map=self.map)
-                    self.map.tiles[start_x+1:start_x + dx*length, start_y+1:start_y + dy*length] = tile_types.floor
+
+        for i in range(self.max_rooms-1):
+            if not self.open_connectors:
+                break
+            room = self.rng.choices(self.prefabs, weights=self.weights)[0]
+            start_connector = self.rng.choice(self.open_connectors)
+            start_x, start_y, direction = start_connector
+            end_connector = room.get_connector_facing(direction.flip(), self.rng)
+            if end_connector is None:
+                continue
+            end_x, end_y = end_connector
+            dx, dy = direction.to_delta()
+            for length in range(self.min_corridor_length, self.max_corridor_length+1):
+                x, y = start_x + dx*length - end_x, start_y + dy*length - end_y
+                if room.check_match(x, y, self.canvas, end_connector) and self.corridor_clear(start_x, start_y, dx, dy, length):
+                    self.carve_corridor(start_x, start_y, dx, dy, length)
                     self.open_connectors.remove(start_connector)
-                    room.connectors.remove(end_connector)
-                    self.open_connectors += room.translate_connectors(start_x + dx*length - end_x, start_y + dy*length - end_y)
+                    self.commit(room, x, y, used_connector=end_connector)
                     self.placed_rooms += 1
                     break
-        if placed_rooms >= self.min_rooms:
+
+        self.seal_open_connectors()
+        connectivity.connect_regions(self.canvas)
+        procgen.place_stairs(self.canvas, depth=1)
+        return self.placed_rooms >= self.min_rooms
+
+    def corridor_clear(self, x: int, y: int, dx: int, dy: int, length: int) -> bool:
+        if length < 2:
             return True
-        else:
-            return False
+        return self.canvas.rect_is(*procgen.corridor_footprint(x, y, dx, dy, length-1, half_width=1), tile_types.WALL)
+
+    def carve_corridor(self, x: int, y: int, dx: int, dy: int, length: int) -> None:
+        self.canvas.set_tile(x, y, tile_types.DOOR)
+        if length >= 2:
+            self.canvas.fill_rect(*procgen.corridor_footprint(x, y, dx, dy, length-1), tile_types.FLOOR)
 
+    def commit(self, room: Prefab, x: int, y: int, used_connector: Optional[Tuple[int, int]] = None) -> None:
+        room.place(x, y, self.canvas, used_connector)
+        if used_connector:
+            self.canvas.set_tile(used_connector[0] + x, used_connector[1] + y, tile_types.DOOR)
+        self.open_connectors += room.translate_connectors(x, y, exclude=used_connector)
+        if room.interior:
+            ix, iy, width, height = room.interior
+            self.canvas.rooms.append(procgen.RectangularRoom(ix + x, iy + y, width, height))
+        for sx, sy, tag, chance in room.spawns:
+            if self.rng.random() < chance:
+                self.canvas.spawns.append((sx + x, sy + y, tag))
+
+    def seal_open_connectors(self) -> None:
+        if not self.open_connectors:
+            return
+        xs, ys, _ = (np.array(values) for values in zip(*self.open_connectors))
+        x1, y1 = int(xs.min()), int(ys.min())
+        connectors = np.zeros((xs.max() - x1 + 1, ys.max() - y1 + 1), dtype=bool, order="F")
+        connectors[xs - x1, ys - y1] = True
+        self.canvas.write_masked(x1, y1, tile_types.WALL, connectors)
+        self.open_connectors = []
+
+    def generate_map(self) -> GameMap:
+        """Generate a floor without an engine, like procgen.build_floor"""
+        canvas = self.generate()
+        dungeon = GameMap(None, canvas.width, canvas.height)
+        canvas.materialize(dungeon)
+        procgen.place_lights(dungeon)
+        for x, y, tag in canvas.spawns:
+            getattr(entities_factory, tag.lower()).spawn(dungeon, x, y)
+        return dungeon
+
+    def make_rectangular_room(self) -> Prefab:
+        width = self.rng.randint(self.min_room_width, self.max_room_width)
+        height = self.rng.randint(self.min_room_height, self.max_room_height)
+        tiles = np.full((width+2, height+2), fill_value=tile_types.WALL, dtype=np.uint8, order="F")
+        tiles[1:-1, 1:-1] = tile_types.FLOOR
+        edge = [(x, 0) for x in range(1, width+1)] + [(x, height+1) for x in range(1, width+1)]
+        edge += [(0, y) for y in range(1, height+1)] + [(width+1, y) for y in range(1, height+1)]
+
+        doors = self.rng.randint(self.min_room_doors, self.max_room_doors)
+        door_loc = []
+        for i in range(doors):
+            if not edge:
+                break
+            door = self.rng.choice(edge)
+            door_loc.append(door)
+            tiles[door] = tile_types.DOOR
+            edge = [loc for loc in edge if abs(loc[0] - door[0]) + abs(loc[1] - door[1]) > 1]
+
+        room = Prefab(tilemap=tiles)
+        room.update_connectors(connector_loc=door_loc)
+        room.interior = (1, 1, width, height)
+        return room
+
+    def load_prefabs(self, parent) -> Tuple[List[Prefab], List[float]]:
+        prefabs, weights = [], []
+        if parent is None:
+            return prefabs, weights
+        for element in parent:
+            tiledata_path = element.get("filepath")
+            if element.tag != "prefab" or not tiledata_path:
+                continue
+            weight = float(element.get("weight") or 1)
+            prefabs.append(self.prefab_cache.load(
+                tiledata_path,
+                element.get("definition"),
+                load_definition=self.load_definition,
+                weight=weight
+            ))
+            weights.append(weight)
+        return prefabs, weights
+
+    def load_definition(self, definition_path: Optional[str]) -> dict:
+        """Reads the symbol mappings of a prefab definition file"""
+        if not definition_path:
+            return {}
+        root = ET.parse(definition_path).getroot()
+        mappings = {}
+        for replace in root.iter("replace"):
+            if replace.get("type") == "Entity":
+                mappings[replace.get("symbol")] = (replace.get("tag"), float(replace.get("chance") or 1))
+        return {"mappings": mappings}
 
     def load_config(self, filepath):
         tree = ET.parse(filepath)
         root = tree.getroot()
 
         if root.tag != "config":
-            raise Error("Incorrect File Type")
+            raise ValueError("Incorrect File Type")
 
         level = root.find("level")
-        self.map = GameMap(engine=self.engine, width=int(level.get("width")), height=int(level.get("height")))
+        self.width, self.height = int(level.get("width")), int(level.get("height"))
         self.min_rooms = int(level.get("min_rooms"))
         self.max_rooms = int(level.get("max_rooms"))
+        self.min_corridor_length, self.max_corridor_length = parse_range(level.get("corridor_length", "0-4"))
 
         rectangular_params = root.find("rectangular")
-        self.min_room_width, self.max_room_width = rectangular_params.get("width").partition("-")[::2]
-        self.min_room_width, self.max_room_width = int(self.min_room_width), int(self.max_room_width)
-        self.min_room_height, self.max_room_height = rectangular_params.get("height").partition("-")[::2]
-        self.min_room_height, self.max_room_height = int(self.min_room_height), int(self.max_room_height)
-        self.min_room_doors, self.max_room_doors = rectangular_params.get("doors").partition("-")[::2]
-        self.min_room_doors, self.max_room_doors = int(self.min_room_doors), int(self.max_room_doors)
+        self.min_room_width, self.max_room_width = parse_range(rectangular_params.get("width"))
+        self.min_room_height, self.max_room_height = parse_range(rectangular_params.get("height"))
+        self.min_room_doors, self.max_room_doors = parse_range(rectangular_params.get("doors"))
         self.number_rectangular_rooms = int(rectangular_params.get("count"))
 
-        rectangular_rooms = []
-        for i in range(self.number_rectangular_rooms):
-            width = random.randint(self.min_room_width, self.max_room_width)
-            height = random.randint(self.min_room_height, self.max_room_height)
-            tiles = np.full((width+2, height+2), fill_value=None, order="F")
-            edge = []
-            for x in range(width):
-                for y in range(height):
-                    if x>0 and x<width+1 and y>0 and y<height+1:
-                        tiles[x, y] = tile_types.floor
-                    else:
-                        tiles[x, y] = tile_types.wall
-                        if not ((x==0 or x==width+1) and (y==0 or y==height+1)):
-                            edge.append((x, y))
-            doors = random.randint(self.min_room_doors, self.max_room_doors)
-            door_loc = []
-            for i in range(doors):
-                door_loc.append(random.choice(edge))
-                tiles[door_loc[-1]] = tile_types.door
-                edge.remove(door_loc[-1])
-                adjacent = []
-                for loc in edge:
-                    if abs(loc[0] - door_loc[-1][0]) + abs(loc[1] - door_loc[-1][1]) <=1:
-                        adjacent.append(loc)
-                for loc in adjacent:
-                    edge.remove(loc)
-            room = Prefab(definition=None, tilemap=tiles)
-            room.update_connectors(connector_loc=door_loc)
-            rectangular_rooms.append(room)
-
-
-        features = root.find("features")
-        for element in features:
-            if element.tag == "prefab":
-                definition_path = element.get("definition")
-                tiledata_path = element.get("filepath")
-                with open(tiledata_path, "rb") as f:
-                    tiledata = load_xp_string(f.read())
-                definition = ET.parse(definition_path)
-                prefab = Prefab(tiledata=tiledata, definition=definition)
-                self.prefabs.append(prefab)
-                self.weights.append(element.get("weight", default=1))
+        rectangular_rooms = [self.make_rectangular_room() for i in range(self.number_rectangular_rooms)]
+
+        self.prefabs, self.weights = self.load_prefabs(root.find("features"))
+        self.prefabs += rectangular_rooms
+        self.weights += [1.0] * len(rectangular_rooms)
+
+        start = root.find("start")
+        self.min_start_x, self.max_start_x = parse_range(start.get("x"))
+        self.min_start_y, self.max_start_y = parse_range(start.get("y"))
+        self.start_rooms, self.start_weights = self.load_prefabs(start)
+        self.prefab_cache.flush()
+        if not self.start_rooms:
+            self.start_rooms, self.start_weights = rectangular_rooms, [1.0] * len(rectangular_rooms)
@@ -1,6 +1,7 @@
-from __future__ import annotations, TYPE_CHECKING
+from __future__ import annotations
 
 import random
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 
 import numpy as np
 
@@ -8,80 +9,105 @@ import tile_types
 from generator.generator_tools import Directions
 
 if TYPE_CHECKING:
-    from game_map import GameMap
+    from generator.canvas import Canvas
+
+# Marks cells of a prefab that don't constrain or change the map
+DONT_CARE = 255
+
+# REXPaint background colour -> (tile id, is connector)
+TILE_COLORS = {
+    (255, 255, 255): (tile_types.FLOOR, False),
+    (255, 0, 0): (tile_types.DOOR, True),
+    (255, 255, 0): (tile_types.FLOOR, True),
+    (156, 156, 156): (tile_types.WALL, False),
+}
+
+Connector = Tuple[int, int, Directions]
 
 class Prefab:
-    def __init__(self, definition, tiledata=None, tilemap=None):
-        self.connectors = []
-        self.tiles = None
+    """
+    A room stamp made of tile ids, with DONT_CARE cells left out of matching and placement.
+    Connectors are the cells other rooms can join on, indexed by the direction they face out of the room.
+    """
+    def __init__(self, definition=None, tiledata=None, tilemap: Optional[np.ndarray] = None, weight: float = 1):
+        self.connectors: Dict[Directions, List[Tuple[int, int]]] = {direction: [] for direction in Directions}
+        self.spawns: List[Tuple[int, int, str, float]] = []
+        self.interior: Optional[Tuple[int, int, int, int]] = None
+        self.definition = definition
+        self.weight = weight
         if tiledata:
             self.parse_tiledata(tiledata)
-        elif tilemap:
-            self.tiles = tilemap
+        elif tilemap is not None:
+            self.tiles = np.asarray(tilemap, dtype=np.uint8, order="F")
         else:
-            raise Error("No tiledata or tilemap")
+            raise ValueError("No tiledata or tilemap")
         self.width, self.height = self.tiles.shape
-        self.definition = definition
+        self.mask = self.tiles != DONT_CARE
+
+    def parse_tiledata(self, tiledata) -> None:
+        """tiledata is the output of xp_loader.load_xp, only the base layer is used"""
+        base_layer = tiledata["layers"][0]
+        self.tiles = np.full(base_layer.shape, fill_value=DONT_CARE, dtype=np.uint8, order="F")
+        mappings = self.definition.get("mappings", {}) if self.definition else {}
+
+        keycodes = base_layer["ch"]
+        unmapped = keycodes != ord(" ")
+        for symbol, (tag, chance) in mappings.items():
+            is_symbol = keycodes == ord(symbol)
+            self.spawns += [(x, y, tag, chance) for x, y in np.argwhere(is_symbol).tolist()]
+            unmapped &= ~is_symbol
+        if unmapped.any():
+            x, y = np.argwhere(unmapped)[0].tolist()
+            raise ValueError(f"Unrecognized symbol {chr(keycodes[x, y])!r} at {x}, {y}")
 
-    def parse_tiledata(self, tiledata):
-        self.tiles = np.full((tiledata["width"], tiledata["height"]), fill_value=None, order="F")
-        tiledata_base_layer = tiledata["layer_data"][0]
-        connector_loc = []
-        for x in range(tiledata_base_layer["width"]):
-            for y in range(tiledata_base_layer["height"]):
-                cell = tiledata_base_layer["cells"][x][y]
-                if cell["keycode"] != ord(" "):
-                    raise Error("Unrecognized Symbol at " + str(x) + ", " + str(y))
-                bg = (cell["back_r"], cell["back_g"], cell["back_b"])
-                if bg = (255, 255, 255):
-                    self.tiles[x, y] = tile_types.floor
-                elif bg = (255, 0, 0):
-                    self.tiles[x, y] = tile_types.door
-                    connector_loc.append((x, y))
-                elif bg=(255, 255, 0):
-                    self.tiles[x, y] = tile_types.floor
-                    connector_loc.append((x, y))
-                elif bg = (156, 156, 156):
-                    self.tiles[x, y] = tile_types.wall
-
-        self.update_connectors(connector_loc=connector_loc)
-
-    def update_connectors(self, connector_loc, clear=False) -> None:
+        connectors = np.zeros(base_layer.shape, dtype=bool)
+        for bg, (tile_id, is_connector) in TILE_COLORS.items():
+            is_color = np.all(base_layer["bg"] == bg, axis=-1)
+            self.tiles[is_color] = tile_id
+            if is_connector:
+                connectors |= is_color
+
+        self.update_connectors(connector_loc=[tuple(location) for location in np.argwhere(connectors).tolist()])
+
+    def update_connectors(self, connector_loc: List[Tuple[int, int]], clear: bool = False) -> None:
+        """Connectors face away from the floor tile next to them"""
         if clear:
-            self.connectors = []
-        for connector in connector_loc:
-            x, y = connector
-            if self.tiles[x+1, y] == tile_types.floor:
-                self.connectors.append(connector, Directions.W)
-            elif self.tiles[x-1, y] == tile_types.floor:
-                self.connectors.append(connector, Directions.E)
-            elif self.tiles[x, y+1] == tile_types.floor:
-                self.connectors.append(connector, Directions.N)
-            elif self.tiles[x, y-1] == tile_types.floor:
-                self.connectors.append(connector, Directions.S)
-
-    def place(self, x: int, y: int, map: GameMap) -> None:
-        map.tiles[x:self.width+x, y:self.height+y] = self.tiles
-
-    def translate_connectors(self, x: int, y: int):
-        translated = [((connector[0][0]+x, connector[0][1]+y), connector[1]) for connector in self.connectors]
-        return translated
-
-    def get_connector_facing(self, dir: Directions):
-        random.shuffle(self.connectors)
-        for connector in self.connectors:
-            if connector[1] == dir:
-                return connector
-
-        return None
-
-    def check_match(self, x: int, y: int, map: GameMap) -> bool:
-        map_width, map_height = map.shape
-        if x+self.width>map_width or x<0 or y+self.height>map_height or y<0:
+            self.connectors = {direction: [] for direction in Directions}
+        width, height = self.tiles.shape
+        for x, y in connector_loc:
+            for direction in Directions:
+                dx, dy = direction.flip().to_delta()
+                if 0 <= x+dx < width and 0 <= y+dy < height and self.tiles[x+dx, y+dy] == tile_types.FLOOR:
+                    self.connectors[direction].append((x, y))
+                    break
+
+    def get_connector_facing(self, dir: Directions, rng: random.Random) -> Optional[Tuple[int, int]]:
+        if not self.connectors[dir]:
+            return None
+        return rng.choice(self.connectors[dir])
+
+    def translate_connectors(self, x: int, y: int, exclude: Optional[Tuple[int, int]] = None) -> List[Connector]:
+        return [
+            (cx + x, cy + y, direction)
+            for direction, locations in self.connectors.items()
+            for cx, cy in locations
+            if (cx, cy) != exclude
+        ]
+
+    def check_match(self, x: int, y: int, canvas: Canvas, connector: Optional[Tuple[int, int]] = None) -> bool:
+        """
+        True if the prefab fits at (x, y): every cell it cares about lands on solid wall,
+        apart from connector, the cell it shares with the room it joins.
+        Walls may be shared, floor and doors never land on another room.
+        """
+        if x < 0 or y < 0 or x+self.width > canvas.width or y+self.height > canvas.height:
             return False
-        map_slice = map.tiles[x:self.width+x, y:self.height+y]
-        for i in range(width):
-            for j in range(height):
-                if self.tiles[i, j] != None and self.tiles[i, j] != map_slice[i, j]:
-                    return False
-        return True
+        fits = (canvas.tiles[x:x+self.width, y:y+self.height] == tile_types.WALL) | ~self.mask
+        if connector is not None:
+            fits[connector] = True
+        return bool(fits.all())
+
+    def place(self, x: int, y: int, canvas: Canvas, connector: Optional[Tuple[int, int]] = None) -> None:
+        if not self.check_match(x, y, canvas, connector):
+            raise ValueError(f"Prefab at {x}, {y} overlaps a placed room")
+        canvas.write_masked(x, y, self.tiles, self.mask)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from generator.generator_tools import Directions
+from generator.prefab import Prefab
+from xp_loader import load_xp_file
+
+'''
+Compiled prefabs are stored in CACHE_DIR as <key>.npy (tile ids, memory mapped on load)
+and <key>.json (connectors and spawns). The key hashes the .xp file and its definition,
+and index.json remembers the hash of each source path by mtime and size so unchanged
+files are never read again.
+'''
+
+CACHE_DIR = ".prefab_cache"
+CACHE_VERSION = 1
+
+def compile_prefab(tiledata_path: str, definition: dict) -> Prefab:
+    return Prefab(definition=definition, tiledata=load_xp_file(tiledata_path))
+
+def save_compiled(prefab: Prefab, base_path: str) -> None:
+    np.save(base_path + ".npy", np.asfortranarray(prefab.tiles))
+    metadata = {
+        "version": CACHE_VERSION,
+        "connectors": {direction.name: locations for direction, locations in prefab.connectors.items()},
+        "spawns": prefab.spawns,
+    }
+    with open(base_path + ".json", "w") as f:
+        json.dump(metadata, f)
+
+def load_compiled(base_path: str, weight: float) -> Optional[Prefab]:
+    try:
+        with open(base_path + ".json") as f:
+            metadata = json.load(f)
+        if metadata.get("version") != CACHE_VERSION:
+            return None
+        tiles = np.load(base_path + ".npy", mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    prefab = Prefab(tilemap=tiles, weight=weight)
+    for name, locations in metadata["connectors"].items():
+        prefab.connectors[Directions[name]] = [tuple(location) for location in locations]
+    prefab.spawns = [tuple(spawn) for spawn in metadata["spawns"]]
+    return prefab
+
+class PrefabCache:
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.index: Dict[str, list] = {}
+        self.index_changed = False
+        try:
+            with open(os.path.join(cache_dir, "index.json")) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def file_hash(self, path: str) -> str:
+        """Hash of a file's contents, reused while its mtime and size are unchanged"""
+        stat = os.stat(path)
+        entry = self.index.get(path)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self.index[path] = [stat.st_mtime_ns, stat.st_size, digest]
+        self.index_changed = True
+        return digest
+
+    def load(
+        self,
+        tiledata_path: str,
+        definition_path: Optional[str],
+        load_definition: Callable[[Optional[str]], dict],
+        weight: float = 1
+    ) -> Prefab:
+        """
+        Load a prefab from its compiled form if the sources haven't changed, otherwise compile and cache it.
+        load_definition(definition_path) is only called on a cache miss.
+        """
+        key = hashlib.sha1(self.file_hash(tiledata_path).encode())
+        if definition_path:
+            key.update(self.file_hash(definition_path).encode())
+        base_path = os.path.join(self.cache_dir, key.hexdigest())
+
+        prefab = load_compiled(base_path, weight)
+        if prefab is None:
+            prefab = compile_prefab(tiledata_path, load_definition(definition_path))
+            prefab.weight = weight
+            os.makedirs(self.cache_dir, exist_ok=True)
+            save_compiled(prefab, base_path)
+        return prefab
+
+    def flush(self) -> None:
+        """Write the hash index back if any file was hashed"""
+        if not self.index_changed:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = os.path.join(self.cache_dir, "index.json.tmp")
+        with open(temp_path, "w") as f:
+            json.dump(self.index, f)
+        os.replace(temp_path, os.path.join(self.cache_dir, "index.json"))
+        self.index_changed = False
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import os
 
+import numpy as np
 import tcod.event
 
 from typing import Callable, Optional, Tuple, TYPE_CHECKING, Union
@@ -11,7 +12,8 @@ from actions import (
     Action,
     BumpAction,
     PickupAction,
-    PassTurn
+    PassTurn,
+    TakeStairsAction
 )
 from render_functions import render_card
 import color
@@ -319,13 +321,24 @@ class InventoryDropHandler(InventoryEventHandler):
 
 
 class SelectTileHandler(AskUserEventHandler):
-    def __init__(self, engine: Engine):
+    def __init__(self, engine: Engine, targets: Optional[np.ndarray] = None):
+        """targets is an optional mask over the map of the tiles worth selecting, they are highlighted"""
         super().__init__(engine)
+        self.targets = targets
         player = self.engine.player
         engine.mouse_location = engine.gamemap_to_screen(player.x, player.y)
 
+    def render_targets(self, console: tcod.Console) -> None:
+        width, height = self.engine.viewport_width-2, self.engine.viewport_height-2
+        shift_x, shift_y = self.engine.game_map.get_map_shift(width, height)
+        targets = self.targets[shift_x:shift_x+width, shift_y:shift_y+height]
+        xs, ys = np.nonzero(targets)
+        console.tiles_rgb["bg"][xs + self.engine.viewport_x+1, ys + self.engine.viewport_y+1] = color.valid_target
+
     def on_render(self, console: tcod.Console) -> None:
         super().on_render(console)
+        if self.targets is not None:
+            self.render_targets(console)
         x, y = self.engine.mouse_location
         x = max(self.engine.viewport_x+1, min(x, self.engine.viewport_x+self.engine.viewport_width-2))
         y = max(self.engine.viewport_y+1, min(y, self.engine.viewport_y+self.engine.viewport_height-2))
@@ -375,8 +388,13 @@ class LookHandler(SelectTileHandler):
 
 
 class SingleRangedAttackHandler(SelectTileHandler):
-    def __init__(self, engine: Engine, callback: Callable[[Tuple[int, int]], Optional[ActionOrHandler]]):
-        super().__init__(engine)
+    def __init__(
+        self,
+        engine: Engine,
+        callback: Callable[[Tuple[int, int]], Optional[ActionOrHandler]],
+        targets: Optional[np.ndarray] = None
+    ):
+        super().__init__(engine, targets)
         self.callback = callback
 
     def on_index_selected(self, x: int, y: int) -> Optional[Action]:
@@ -453,7 +471,7 @@ class PlayCardEventHandler(AskUserEventHandler):
         return None
 
     def on_card_selected(self, card: Card) -> Optional[Action]:
-        return card.effect.get_action(self.engine.player)
+        return card.get_action(self.engine.player)
 
 
 class MainGameEventHandler(EventHandler):
@@ -463,7 +481,9 @@ class MainGameEventHandler(EventHandler):
 
         player = self.engine.player
 
-        if key in MOVE_KEYS:
+        if key in (tcod.event.K_PERIOD, tcod.event.K_COMMA) and event.mod & (tcod.event.KMOD_LSHIFT | tcod.event.KMOD_RSHIFT):
+            action = TakeStairsAction(player)
+        elif key in MOVE_KEYS:
             dx, dy = MOVE_KEYS[key]
             action = BumpAction(player, dx, dy)
         elif key in WAIT_KEYS:
@@ -503,7 +523,7 @@ class MainGameEventHandler(EventHandler):
                 height=self.engine.player.hand.size
             ):
                 card_index = self.engine.mouse_location[1] - (self.engine.hand_y+3)
-                return self.engine.player.hand.cards[card_index].effect.get_action(self.engine.player)
+                return self.engine.player.hand.cards[card_index].get_action(self.engine.player)
             elif self.engine.mouse_in_rect(
                 x=self.engine.deck_stats_x+1,
                 y=self.engine.deck_stats_y+1,
@@ -525,6 +545,7 @@ class GameOverEventHandler(EventHandler):
     def on_quit(self) -> None:
         if os.path.exists("savegame.sav"):
             os.remove("savegame.sav")
+        self.engine.floor_manager.discard()
         raise exceptions.QuitWithoutSaving()
 
     def ev_quit(self, event: tcod.event.Quit):
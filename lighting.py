@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import weakref
+from typing import Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+from tcod.map import compute_fov
+
+if TYPE_CHECKING:
+    from game_map import GameMap
+
+'''
+Light is stored as float RGB patches, (x, y, light) with light[i, j] the amount added to tile (x+i, y+j).
+A LightMap sums the patches of its sources once and keeps the result until the sources or the
+tiles change, so static lights cost nothing per frame and the player's light is only recast
+when the player moves. composite scales tile graphics by ambient light plus every patch over them.
+'''
+
+# Brightness of a tile no light reaches
+AMBIENT = 0.45
+
+LightPatch = Tuple[int, int, np.ndarray]
+
+class LightSource:
+    def __init__(self, x: int, y: int, radius: int, color: Tuple[int, int, int] = (255, 255, 255), intensity: float = 1.0):
+        self.x = x
+        self.y = y
+        self.radius = radius
+        self.color = color
+        self.intensity = intensity
+
+    @property
+    def key(self) -> Tuple:
+        return (self.x, self.y, self.radius, self.color, self.intensity)
+
+def cast_light(game_map: GameMap, source: LightSource) -> LightPatch:
+    """Light reaching the tiles within radius of the source, fading linearly with distance"""
+    window = game_map.fov_window(source.x, source.y, source.radius)
+    x1, y1 = window[0].start, window[1].start
+    lit = compute_fov(game_map.transparent[window], (source.x - x1, source.y - y1), radius=source.radius, light_walls=True)
+    dx, dy = np.ogrid[x1 - source.x:window[0].stop - source.x, y1 - source.y:window[1].stop - source.y]
+    falloff = np.clip(1 - np.sqrt(dx*dx + dy*dy) / (source.radius + 1), 0, 1) * lit * source.intensity
+    color = np.asarray(source.color, dtype=np.float32) / 255
+    return x1, y1, falloff[..., np.newaxis].astype(np.float32) * color
+
+def overlap(x: int, y: int, width: int, height: int, patch: LightPatch) -> Optional[Tuple[Tuple[slice, slice], Tuple[slice, slice]]]:
+    """Slices into the window (x, y, width, height) and into the patch where they overlap"""
+    patch_x, patch_y, light = patch
+    left, top = max(x, patch_x), max(y, patch_y)
+    right, bottom = min(x + width, patch_x + light.shape[0]), min(y + height, patch_y + light.shape[1])
+    if left >= right or top >= bottom:
+        return None
+    return (
+        (slice(left - x, right - x), slice(top - y, bottom - y)),
+        (slice(left - patch_x, right - patch_x), slice(top - patch_y, bottom - patch_y))
+    )
+
+class LightMap:
+    """
+    The summed light of a set of sources, recast only when the sources, the map or its tiles change.
+    The map is keyed by a weak reference: every new floor starts at the same tiles_version,
+    and a light carried between floors mustn't keep the last one alive.
+    """
+    def __init__(self, sources: Iterable[LightSource] = ()):
+        self.sources: List[LightSource] = list(sources)
+        self._key: Optional[Tuple] = None
+        self._patch: LightPatch = (0, 0, np.zeros((0, 0, 3), dtype=np.float32))
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_key"] = None
+        state["_patch"] = (0, 0, np.zeros((0, 0, 3), dtype=np.float32))
+        return state
+
+    def add(self, source: LightSource) -> None:
+        self.sources.append(source)
+
+    def get(self, game_map: GameMap) -> LightPatch:
+        key = (weakref.ref(game_map), game_map.tiles_version, tuple(source.key for source in self.sources))
+        if key != self._key:
+            self._key = key
+            self._patch = self.cast(game_map)
+        return self._patch
+
+    def cast(self, game_map: GameMap) -> LightPatch:
+        """One patch covering the bounding box of every source"""
+        patches = [cast_light(game_map, source) for source in self.sources]
+        if not patches:
+            return (0, 0, np.zeros((0, 0, 3), dtype=np.float32))
+        x1 = min(x for x, y, light in patches)
+        y1 = min(y for x, y, light in patches)
+        x2 = max(x + light.shape[0] for x, y, light in patches)
+        y2 = max(y + light.shape[1] for x, y, light in patches)
+        total = np.zeros((x2 - x1, y2 - y1, 3), dtype=np.float32)
+        for x, y, light in patches:
+            total[x - x1:x - x1 + light.shape[0], y - y1:y - y1 + light.shape[1]] += light
+        return x1, y1, total
+
+def composite(graphics: np.ndarray, x: int, y: int, patches: Iterable[LightPatch], ambient: float = AMBIENT) -> None:
+    """Scale the colours of graphics, a tile_types.graphic_dt array of the map from (x, y), by the light over it"""
+    width, height = graphics.shape
+    brightness = np.full((width, height, 3), ambient, dtype=np.float32)
+    for patch in patches:
+        slices = overlap(x, y, width, height, patch)
+        if slices:
+            window, light = slices
+            brightness[window] += patch[2][light]
+    np.clip(brightness, 0, 1, out=brightness)
+    graphics["fg"] = graphics["fg"] * brightness
+    graphics["bg"] = graphics["bg"] * brightness
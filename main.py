@@ -17,6 +17,8 @@ def save_game(handler: input_handler.BaseEventHandler, filename: str) -> None:
     if isinstance(handler, input_handler.EventHandler):
         handler.engine.save_as(filename)
         print("Game saved.")
+        # The save holds the spilled floors, the run's own copies can go
+        handler.engine.floor_manager.discard()
 
 def main() -> None:
     """Script entry point."""
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Iterator, Tuple, List, TYPE_CHECKING
+from typing import Iterator, Tuple, List
 
 import random
 import math
@@ -7,12 +7,12 @@ import tcod
 import numpy as np
 
 from game_map import GameMap
+from generator.canvas import Canvas
+from generator import connectivity
 from generator.generator_tools import Directions
 import tile_types
 import entities_factory
-
-if TYPE_CHECKING:
-    from engine import Engine
+import lighting
 
 class RectangularRoom:
     def __init__(self, x: int, y: int, width: int, height: int):
@@ -52,19 +52,8 @@ class RectangularRoom:
             and self.y2 < map_height-1
         )
 
-    def get_possible_doors(self, map: GameMap) -> List[Tuple[int, int]]:
-        locations = []
-        for i in range(self.x2 - self.x1):
-            if map.tiles[self.x1+i, self.y1-1] == tile_types.wall and map.tiles[self.x1+i, self.y1-2] == tile_types.floor:
-                locations.append((self.x1+i, self.y1-1))
-            if map.tiles[self.x1+i, self.y2] == tile_types.wall and map.tiles[self.x1+i, self.y2+1] == tile_types.floor:
-                locations.append((self.x1+i, self.y2))
-        for j in range(self.y2 - self.y1):
-            if map.tiles[self.x1-1, self.y1+j] == tile_types.wall and map.tiles[self.x1-2, self.y1+j] == tile_types.floor:
-                locations.append((self.x1-1, self.y1+j))
-            if map.tiles[self.x2, self.y1+j] == tile_types.wall and map.tiles[self.x2+1, self.y1+j] == tile_types.floor:
-                locations.append((self.x2, self.y1+j))
-        return locations
+    def get_possible_doors(self, canvas: Canvas) -> List[Tuple[int, int]]:
+        return canvas.door_sites([self])[0]
 
 def get_adjacent(x, y, width, height):
     adjacent = []
@@ -102,7 +91,7 @@ def djikstra_fill(map, source):
 
     return d_map
 
-def path(map, start, finish):
+def path(map, start, finish, rng: random.Random):
     start_x, start_y = start
     finish_x, finish_y = finish
 
@@ -118,189 +107,187 @@ def path(map, start, finish):
         for tile in adjacent:
             val = min(val, d_map[tile])
         lowest_tiles = [tile for tile in adjacent if d_map[tile] == val]
-        path.append(random.choice(lowest_tiles))
+        path.append(rng.choice(lowest_tiles))
 
     return path
 
 def in_bounds(x : int, y : int, width : int, height : int) -> bool:
     return (x >= 0 and x < width and y >= 0 and y < height)
 
-def clear_path(x : int, y : int, dir : Directions, step_size : int, map : GameMap) -> bool:
-    width, height = map.width, map.height
+def corridor_footprint(x: int, y: int, dx: int, dy: int, step_size: int, half_width: int = 0) -> Tuple[int, int, int, int]:
+    """
+    Bounding rectangle (x1, y1, x2, y2, exclusive end) of the step_size tiles past (x, y) in direction (dx, dy),
+    widened by half_width tiles on each side
+    """
+    end_x, end_y = x + dx*step_size, y + dy*step_size
+    x1 = min(x + dx, end_x) - half_width*abs(dy)
+    x2 = max(x + dx, end_x) + half_width*abs(dy) + 1
+    y1 = min(y + dy, end_y) - half_width*abs(dx)
+    y2 = max(y + dy, end_y) + half_width*abs(dx) + 1
+    return x1, y1, x2, y2
+
+def clear_path(x : int, y : int, dir : Directions, step_size : int, canvas : Canvas) -> bool:
     dx, dy = dir.to_delta()
-    width = 1
-    try:
-        for i in range(1, step_size+1):
-            for j in range(-width, width+1):
-                if map.tiles[x+i*dx+j*dy, y+i*dy+j*dx] != tile_types.wall:
-                    return False
-                if x+i*dx+j*dy < 0 or y+i*dy+j*dx < 0:
-                    return False
-    except:
-        return False
-    return True
+    return canvas.rect_is(*corridor_footprint(x, y, dx, dy, step_size, half_width=1), tile_types.WALL)
 
 class Tunneler:
-    def __init__(self, start, lifespan, start_dir, min_step_size, max_step_size, turn_prob):
+    def __init__(
+        self,
+        start,
+        lifespan,
+        start_dir,
+        min_step_size,
+        max_step_size,
+        turn_prob,
+        rng: random.Random,
+        room_prob: float = 0.2,
+        branch_prob: float = 0.2,
+        room_min_size: int = 6,
+        room_max_size: int = 10
+    ):
+        self.rng = rng
         self.x, self.y = start
         self.lifespan = lifespan
         self.dir = start_dir
         self.min_step_size = min_step_size
         self.max_step_size = max_step_size
         self.turn_prob = turn_prob
-        self.room_prob = 0.2
-        self.branch_prob = 0.2
+        self.room_prob = room_prob
+        self.branch_prob = branch_prob
+        self.room_min_size = room_min_size
+        self.room_max_size = room_max_size
         self.children = []
 
-    def update(self, map):
-        width, height = map.width, map.height
-        step_size = random.randint(self.min_step_size, self.max_step_size)
+    def update(self, canvas: Canvas) -> None:
+        step_size = self.rng.randint(self.min_step_size, self.max_step_size)
         outgoing = [dir for dir in Directions if dir != self.dir.flip()]
-        if random.random() < self.turn_prob:
-            s = random.randint(0, 1)
+        if self.rng.random() < self.turn_prob:
+            s = self.rng.randint(0, 1)
             self.dir = self.dir.rot(2*s - 1)
         outgoing.remove(self.dir)
-        random.shuffle(outgoing)
+        self.rng.shuffle(outgoing)
         dx, dy = self.dir.to_delta()
-        if clear_path(self.x, self.y, self.dir, step_size, map):
-            self.make_corridor(dx=dx, dy=dy, step_size=step_size, map=map)
-        elif clear_path(self.x, self.y, outgoing[0], step_size, map):
+        if clear_path(self.x, self.y, self.dir, step_size, canvas):
+            self.make_corridor(dx=dx, dy=dy, step_size=step_size, canvas=canvas)
+        elif clear_path(self.x, self.y, outgoing[0], step_size, canvas):
             dx, dy = outgoing[0].to_delta()
-            self.make_corridor(dx=dx, dy=dy, step_size=step_size, map=map)
-        elif clear_path(self.x, self.y, outgoing[1], step_size, map):
+            self.make_corridor(dx=dx, dy=dy, step_size=step_size, canvas=canvas)
+        elif clear_path(self.x, self.y, outgoing[1], step_size, canvas):
             dx, dy = outgoing[1].to_delta()
-            self.make_corridor(dx=dx, dy=dy, step_size=step_size, map=map)
+            self.make_corridor(dx=dx, dy=dy, step_size=step_size, canvas=canvas)
         else:
             self.lifespan = 0
 
-    def make_corridor(self, dx : int, dy : int, step_size: int, map : GameMap) -> None:
+    def make_corridor(self, dx : int, dy : int, step_size: int, canvas : Canvas) -> None:
+        canvas.fill_rect(*corridor_footprint(self.x, self.y, dx, dy, step_size), tile_types.FLOOR)
         for i in range(1, step_size+1):
-            if random.random() < self.room_prob:
-                s = random.randint(0, 1)
+            if self.rng.random() < self.room_prob:
                 self.children.append(Builder(
                     x=self.x+i*dx,
                     y=self.y+i*dy,
-                    room_min_size=6,
-                    room_max_size=10
+                    room_min_size=self.room_min_size,
+                    room_max_size=self.room_max_size,
+                    rng=self.rng
                 ))
-            map.tiles[self.x+i*dx, self.y+i*dy] = tile_types.floor
         self.x, self.y = self.x+step_size*dx, self.y+step_size*dy
         self.lifespan -= 1
-        if random.random() < self.branch_prob:
-            dir=random.choice([dir for dir in Directions if dir != self.dir.flip()])
+        if self.rng.random() < self.branch_prob:
+            dir=self.rng.choice([dir for dir in Directions if dir != self.dir.flip()])
             self.children.append(Tunneler(
                 start=(self.x, self.y),
                 lifespan=5,
                 start_dir=dir,
                 min_step_size=self.min_step_size,
                 max_step_size=self.max_step_size,
-                turn_prob=self.turn_prob
+                turn_prob=self.turn_prob,
+                rng=self.rng,
+                room_prob=self.room_prob,
+                branch_prob=self.branch_prob,
+                room_min_size=self.room_min_size,
+                room_max_size=self.room_max_size
             ))
 
 class Builder:
-    def __init__(self, x: int, y : int, room_min_size: int, room_max_size : int) -> None:
+    def __init__(self, x: int, y : int, room_min_size: int, room_max_size : int, rng: random.Random) -> None:
+        self.rng = rng
         self.x, self.y = x, y
         self.lifespan = 1
         self.children = []
         self.room_min_size = room_min_size
         self.room_max_size = room_max_size
 
-    def update(self, map) -> None:
-        room_width = random.randint(self.room_min_size, self.room_max_size)
-        room_height = random.randint(self.room_min_size, self.room_max_size)
-        candidates = self.scan(width=room_width, height=room_height, map=map)
+    def update(self, canvas: Canvas) -> None:
+        room_width = self.rng.randint(self.room_min_size, self.room_max_size)
+        room_height = self.rng.randint(self.room_min_size, self.room_max_size)
+        candidates = self.scan(width=room_width, height=room_height, canvas=canvas)
         if candidates:
-            room = random.choice(candidates)
-            map.tiles[room.inner] = tile_types.floor
-            map.tiles[random.choice(room.get_possible_doors(map))] = tile_types.door
-            place_entities(room, map, 2, 2)
-            #rooms.append(room)
+            room = self.rng.choice(candidates)
+            canvas.fill_rect(room.x1, room.y1, room.x2, room.y2, tile_types.FLOOR)
+            canvas.set_tile(*self.rng.choice(room.get_possible_doors(canvas)), tile_types.DOOR)
+            canvas.rooms.append(room)
         self.lifespan = 0
 
-    def scan(self, width : int, height : int, map : GameMap) -> List[RectangularRoom]:
-        open_locations = []
-        for i in range(0, width):
-            open_locations += self.test_room(
-                width=width,
-                height=height,
-                x=self.x-i,
-                y=self.y-height-1,
-                map=map
-            )
-            open_locations += self.test_room(
-                width=width,
-                height=height,
-                x=self.x-i,
-                y=self.y+2,
-                map=map
-            )
-        for j in range(0, height):
-            open_locations += self.test_room(
-                width=width,
-                height=height,
-                x=self.x-width-1,
-                y=self.y-j,
-                map=map
-            )
-            open_locations += self.test_room(
-                width=width,
-                height=height,
-                x=self.x+2,
-                y=self.y-j,
-                map=map
-            )
-        return open_locations
-
-    def test_room(self, width: int, height: int, x: int, y: int, map: GameMap) -> List[RectangularRoom]:
-        test_room = RectangularRoom(
-            x=x,
-            y=y,
-            width=width,
-            height=height
-        )
-        if test_room.in_bounds(map_width=map.width, map_height=map.height):
-            if np.all(map.tiles[test_room.outer] == tile_types.wall):
-                if test_room.get_possible_doors(map):
-                    return [test_room]
-        return []
-
-def generate_dungeon(
-    max_rooms:int,
-    room_min_size:int,
-    room_max_size:int,
-    map_width:int,
-    map_height:int,
-    engine:Engine,
-    max_monsters_per_room: int,
-    max_items_per_room: int
-) ->GameMap:
-
-    player = engine.player
-    dungeon = GameMap(engine, map_width, map_height, entities=[player])
-
-    rooms: List[RectangularRoom] = []
-
-    dungeon.tiles[map_width//2, map_height//2] = tile_types.floor
-    player.place(map_width//2, map_height//2, dungeon)
+    def scan(self, width : int, height : int, canvas : Canvas) -> List[RectangularRoom]:
+        """
+        Rooms of the given size on any side of the builder that fit in solid wall and have a door site.
+        Every candidate is checked at once against the canvas summed-area table and door site sums.
+        """
+        offsets_x, offsets_y = np.arange(width), np.arange(height)
+        x1 = np.concatenate([np.repeat(self.x - offsets_x, 2), np.tile([self.x - width - 1, self.x + 2], height)])
+        y1 = np.concatenate([np.tile([self.y - height - 1, self.y + 2], width), np.repeat(self.y - offsets_y, 2)])
+        x2, y2 = x1 + width, y1 + height
+
+        in_bounds = (x1 > 1) & (x2 < canvas.width-1) & (y1 > 1) & (y2 < canvas.height-1)
+        x1, y1, x2, y2 = x1[in_bounds], y1[in_bounds], x2[in_bounds], y2[in_bounds]
+        fits = canvas.rects_all_wall(x1-1, y1-1, x2+1, y2+1) & canvas.rects_have_door_site(x1, y1, x2, y2)
+
+        return [
+            RectangularRoom(x=x, y=y, width=width, height=height)
+            for x, y in zip(x1[fits].tolist(), y1[fits].tolist())
+        ]
+
+def generate_layout(
+    map_width: int,
+    map_height: int,
+    rng: random.Random,
+    depth: int = 1,
+    room_min_size: int = 6,
+    room_max_size: int = 10,
+    turn_prob: float = 0.5,
+    room_prob: float = 0.2,
+    branch_prob: float = 0.2,
+    number_generations: int = 8,
+    connect: bool = True
+) -> Canvas:
+    """
+    Tunnel out the tiles, rooms and stairs of a floor, without any entities.
+    Unless connect is False, any region cut off from the start is joined back with a corridor.
+    """
+    canvas = Canvas(map_width, map_height)
+    canvas.start = (map_width//2, map_height//2)
+    canvas.set_tile(*canvas.start, tile_types.FLOOR)
 
     tunnelers = [Tunneler(
-        start=(map_width//2, map_height//2),
+        start=canvas.start,
         lifespan=5,
         start_dir=Directions.N,
         min_step_size=4,
         max_step_size=7,
-        turn_prob=0.5
+        turn_prob=turn_prob,
+        rng=rng,
+        room_prob=room_prob,
+        branch_prob=branch_prob,
+        room_min_size=room_min_size,
+        room_max_size=room_max_size
     )]
 
     dead = []
     children = []
 
-    number_generations = 8
-
     for i in range(number_generations):
         while tunnelers:
             for t in tunnelers:
-                t.update(dungeon)
+                t.update(canvas)
                 if t.lifespan == 0:
                     dead.append(t)
             for t in dead:
@@ -311,33 +298,139 @@ def generate_dungeon(
             tunnelers.append(child)
         children = []
 
+    if connect:
+        connectivity.connect_regions(canvas)
+    place_stairs(canvas, depth)
+
+    return canvas
+
+def build_floor(
+    room_min_size:int,
+    room_max_size:int,
+    map_width:int,
+    map_height:int,
+    max_monsters_per_room: int,
+    max_items_per_room: int,
+    rng: random.Random,
+    depth: int = 1,
+    fov_radius: int = 8
+) -> GameMap:
+    """
+    Generate a complete floor without an engine or player, so it can be built on a worker process.
+    The field of view from the start location is computed up front.
+    """
+    dungeon = GameMap(None, map_width, map_height, depth=depth)
+    canvas = generate_layout(
+        map_width=map_width,
+        map_height=map_height,
+        rng=rng,
+        depth=depth,
+        room_min_size=room_min_size,
+        room_max_size=room_max_size
+    )
+    canvas.materialize(dungeon)
+    place_lights(dungeon)
+
+    free = free_floor(dungeon)
+    for room in canvas.rooms:
+        place_entities(room, dungeon, free, max_monsters_per_room, max_items_per_room, rng)
+
+    dungeon.update_fov(*canvas.start, radius=fov_radius)
+
     return dungeon
 
-def place_entities(room: RectangularRoom, dungeon: GameMap, max_monsters: int, max_items: int) -> None:
-    number_of_monsters = random.randint(0, max_monsters)
-    number_of_items = random.randint(0, max_items)
-    for i in range(number_of_monsters):
-        x = random.randint(room.x1 + 1, room.x2 - 1)
-        y = random.randint(room.y1 + 1, room.y2 - 1)
-
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
-            if random.random() < 0.8:
-                entities_factory.orc.spawn(dungeon, x, y)
-            else:
-                entities_factory.troll.spawn(dungeon, x, y)
-
-    for i in range(number_of_items):
-        x = random.randint(room.x1 + 1, room.x2 - 1)
-        y = random.randint(room.y1 + 1, room.y2 - 1)
-
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
-            item_chance = random.random()
-
-            if item_chance < 0.7:
-                entities_factory.health_potion.spawn(dungeon, x, y)
-            elif item_chance< 0.8:
-                entities_factory.fireball_scroll.spawn(dungeon, x, y)
-            elif item_chance < 0.9:
-                entities_factory.confusion_scroll.spawn(dungeon, x, y)
-            else:
-                entities_factory.lightning_scroll.spawn(dungeon, x, y)
+def place_stairs(canvas: Canvas, depth: int) -> None:
+    """Put the down stairs on the floor tile furthest from the start.
+
+    Floors below the first also get up stairs at the start.
+    """
+    distance = tcod.path.maxarray((canvas.width, canvas.height), order="F")
+    distance[canvas.start] = 0
+    tcod.path.dijkstra2d(distance, canvas.walkable.astype(np.int8), 2, 3, out=distance)
+    distance[distance == np.iinfo(distance.dtype).max] = 0
+
+    downstairs = np.unravel_index(np.argmax(distance), distance.shape)
+    canvas.downstairs_location = (int(downstairs[0]), int(downstairs[1]))
+    canvas.set_tile(*canvas.downstairs_location, tile_types.DOWN_STAIRS)
+
+    if depth > 1:
+        canvas.upstairs_location = canvas.start
+        canvas.set_tile(*canvas.start, tile_types.UP_STAIRS)
+
+def place_lights(dungeon: GameMap) -> None:
+    """Stairs give off a warm glow"""
+    for location in (dungeon.downstairs_location, dungeon.upstairs_location):
+        if location:
+            dungeon.static_lights.add(lighting.LightSource(*location, radius=4, color=(255, 190, 110), intensity=0.5))
+
+def spread_positions(free: np.ndarray, count: int, min_spacing: int, rng: random.Random) -> List[Tuple[int, int]]:
+    """
+    Up to count tiles from the free mask, dart thrown so no two chosen tiles are closer than min_spacing
+    (Chebyshev distance). If the spacing rules out too many tiles the rest go on any free tile.
+    Chosen tiles are cleared from free.
+    """
+    candidates = np.argwhere(free).tolist()
+    rng.shuffle(candidates)
+    spaced = free.copy()
+    reach = min_spacing - 1
+    chosen = []
+    for x, y in candidates:
+        if len(chosen) == count:
+            break
+        if spaced[x, y]:
+            chosen.append((x, y))
+            free[x, y] = False
+            spaced[max(0, x-reach):x+reach+1, max(0, y-reach):y+reach+1] = False
+    for x, y in candidates:
+        if len(chosen) == count:
+            break
+        if free[x, y]:
+            chosen.append((x, y))
+            free[x, y] = False
+    return chosen
+
+def free_floor(dungeon: GameMap) -> np.ndarray:
+    """Walkable tiles that aren't stairs, the start location or taken by an entity"""
+    free = dungeon.walkable.copy()
+    for location in (dungeon.start_location, dungeon.downstairs_location, dungeon.upstairs_location):
+        if location:
+            free[location] = False
+    for entity in dungeon.entities:
+        free[entity.x, entity.y] = False
+    return free
+
+def place_entities(
+    room: RectangularRoom,
+    dungeon: GameMap,
+    free: np.ndarray,
+    max_monsters: int,
+    max_items: int,
+    rng: random.Random,
+    monster_spacing: int = 2
+) -> None:
+    """
+    Spawn monsters spread at least monster_spacing apart, then items, on free tiles of the room.
+    free is the occupancy mask of the whole floor from free_floor, and is kept up to date.
+    """
+    number_of_monsters = rng.randint(0, max_monsters)
+    number_of_items = rng.randint(0, max_items)
+    left, top = room.x1 + 1, room.y1 + 1
+    room_free = free[left:room.x2, top:room.y2]
+
+    for x, y in spread_positions(room_free, number_of_monsters, monster_spacing, rng):
+        if rng.random() < 0.8:
+            entities_factory.orc.spawn(dungeon, left + x, top + y)
+        else:
+            entities_factory.troll.spawn(dungeon, left + x, top + y)
+
+    for x, y in spread_positions(room_free, number_of_items, 1, rng):
+        item_chance = rng.random()
+
+        if item_chance < 0.7:
+            entities_factory.health_potion.spawn(dungeon, left + x, top + y)
+        elif item_chance< 0.8:
+            entities_factory.fireball_scroll.spawn(dungeon, left + x, top + y)
+        elif item_chance < 0.9:
+            entities_factory.confusion_scroll.spawn(dungeon, left + x, top + y)
+        else:
+            entities_factory.lightning_scroll.spawn(dungeon, left + x, top + y)
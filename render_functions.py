@@ -190,3 +190,4 @@ def render_status(
         y=y+1
     )
     render_names_at_mouse_location(console=console, x=x+1, y=y+2, width=width-2, height=3, engine=engine)
+    console.print(x=x+1, y=y+height-2, string=f"Floor: {engine.game_map.depth}")
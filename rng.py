@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import random
+import zlib
+from typing import Union
+
+import numpy as np
+
+'''
+Every random stream in a run is derived from the run seed plus a key naming its use,
+eg. ("floor", 3) or ("deck",). Streams are independent of each other, so drawing more
+numbers in one subsystem never shifts the results of another.
+'''
+
+StreamKey = Union[str, int]
+
+def new_run_seed() -> int:
+    return random.SystemRandom().getrandbits(64)
+
+def seed_sequence(run_seed: int, *keys: StreamKey) -> np.random.SeedSequence:
+    spawn_key = tuple(zlib.crc32(key.encode()) if isinstance(key, str) else int(key) for key in keys)
+    return np.random.SeedSequence(run_seed, spawn_key=spawn_key)
+
+def stream_seed(run_seed: int, *keys: StreamKey) -> int:
+    low, high = seed_sequence(run_seed, *keys).generate_state(2, dtype=np.uint32)
+    return (int(high) << 32) | int(low)
+
+def make_random(run_seed: int, *keys: StreamKey) -> random.Random:
+    return random.Random(stream_seed(run_seed, *keys))
+
+def make_generator(run_seed: int, *keys: StreamKey) -> np.random.Generator:
+    return np.random.default_rng(seed_sequence(run_seed, *keys))
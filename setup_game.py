@@ -9,43 +9,45 @@ import color
 import lzma
 import pickle
 import traceback
+from concurrent.futures import Future
 from engine import Engine
 import entities_factory
 import input_handler
-from procgen import generate_dungeon
+import rng
+from floor_manager import FloorManager, prefetch_floor
 
 #Load image and remove alpha channel
 background_image = tcod.image.load("assets/backgrounds/menu_background.png")[:, :, :3]
 #background_image = tcod.image.load("menu_background.png")[:, :, :3]
 
-def new_game() -> Engine:
-    map_width = 80
-    map_height = 80
+floor_params = dict(
+    room_min_size=6,
+    room_max_size=10,
+    map_width=80,
+    map_height=80,
+    max_monsters_per_room=2,
+    max_items_per_room=2
+)
 
-    room_max_size = 10
-    room_min_size = 6
-    max_rooms = 50
-
-    max_monsters_per_room = 2
-    max_items_per_room = 2
+def new_game(seed: Optional[int] = None, first_floor: Optional[Future] = None) -> Engine:
+    """first_floor can be a build of floor 1 for this seed already started with prefetch_floor"""
+    if seed is None:
+        seed = rng.new_run_seed()
 
     player = copy.deepcopy(entities_factory.player)
+    player.deck.rng = rng.make_random(seed, "deck")
+    player.deck.shuffle()
+    player.deck.draw_to_zone(zone=player.hand, number_of_cards=5)
 
-    engine = Engine(player=player)
+    engine = Engine(player=player, seed=seed)
 
-    engine.game_map = generate_dungeon(
-        max_rooms=max_rooms,
-        room_min_size=room_min_size,
-        room_max_size=room_max_size,
-        engine=engine,
-        map_width=map_width,
-        map_height=map_height,
-        max_monsters_per_room=max_monsters_per_room,
-        max_items_per_room=max_items_per_room
-    )
-    engine.update_fov()
+    engine.floor_manager = FloorManager(engine=engine, floor_params=floor_params)
+    if first_floor is not None:
+        engine.floor_manager.prefetch(1, first_floor)
+    engine.floor_manager.descend()
 
     engine.message_log.add_message("Hello and welcome adventurer!", color.welcome_text)
+    engine.message_log.add_message(f"Run seed: {seed}", color.impossible)
 
     return engine
 
@@ -56,6 +58,10 @@ def load_game(filename: str) -> Engine:
     return engine
 
 class MainMenu(input_handler.BaseEventHandler):
+    def __init__(self) -> None:
+        #Start building the first floor of the next new game while the menu is shown
+        self.next_seed = rng.new_run_seed()
+        self.first_floor = prefetch_floor(floor_params, self.next_seed, 1, Engine.fov_radius)
 
     def on_render(self, console: tcod.Console) -> None:
         console.draw_semigraphics(background_image, 0, 0)
@@ -103,6 +109,6 @@ class MainMenu(input_handler.BaseEventHandler):
                 traceback.print_exc()
                 return input_handler.PopupMessage(self, f"Failed to load save:\n{exc}")
         elif event.sym == tcod.event.K_n:
-            return input_handler.MainGameEventHandler(new_game())
+            return input_handler.MainGameEventHandler(new_game(self.next_seed, self.first_floor))
 
         return None
@@ -51,9 +51,25 @@ wall = new_tile(
     dark=(ord(" "), (255, 255, 255), (110, 110, 110)),
     light=(ord(" "), (255, 255, 255), (130, 110, 50)),
 )
+down_stairs = new_tile(
+    walkable=True,
+    transparent=True,
+    dark=(ord(">"), (0, 0, 100), (180, 180, 180)),
+    light=(ord(">"), (255, 255, 255), (200, 180, 50)),
+)
+up_stairs = new_tile(
+    walkable=True,
+    transparent=True,
+    dark=(ord("<"), (0, 0, 100), (180, 180, 180)),
+    light=(ord("<"), (255, 255, 255), (200, 180, 50)),
+)
 hightlight = new_tile(
     walkable=False,
     transparent=False,
     dark=(ord(" "), (255, 255, 255), (110, 110, 110)),
     light=(ord(" "), (255, 255, 255), (225, 0, 0)),
 )
+
+# Maps are stored as arrays of indices into this table, see game_map.py and generator/canvas.py
+palette = np.array([wall, floor, door, down_stairs, up_stairs, hightlight], dtype=tile_dt)
+WALL, FLOOR, DOOR, DOWN_STAIRS, UP_STAIRS, HIGHLIGHT = range(len(palette))
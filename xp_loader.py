@@ -1,19 +1,26 @@
-import libtcodpy as libtcod
+import gzip
+
+import numpy as np
 
 ##################################
 # In-memory XP format is as follows:
-# Returned structure is a dictionary with the keys version, layers, width, height, and layer_data
+# Returned structure is a dictionary with the keys version, layer_count, width, height, and layers
 ## Version is stored in case it's useful for someone, but as mentioned in the format description it probably won't be unless format changes happen
 ## Layers is a full 32 bit int, though right now REXPaint only exports or manages up to 4 layers
 ## Width and height are extracted from the layer with largest width and height - this value will hold true for all layers for now as per the format description
-## layer_data is a list of individual layers, which are stored in the following format
-### Each layer is a dictionary with keys width, height (see above), and cells. 
-### Cells is a row major 2d array of, again, dictionaries with the values 'keycode' (ascii keycode), 'fore_r/g/b', and 'back_r/g/b' (technically ints but in value 0-255)
+## layers is a list of structured numpy arrays of shape (width, height) and dtype xp_cell_dt, indexed [x, y]
+### The arrays are views of the decompressed data, no per-cell parsing or copying is done
+### xp_cell_dt has the same layout as tcod's Console.tiles_rgb, so a layer can be assigned to a console directly
+##
+## The old nested dict format (layer_data, see parse_layer) is still available through load_xp_string
+##
+## load_xp_file streams a .xp file straight from gzip into one preallocated array per layer,
+## save_xp writes a list of layers back out, encoding each as a single block of bytes
 ##################################
 
 
 ##################################
-# Used primarily internally to parse the data, feel free to reference them externally if it's useful. 
+# Used primarily internally to parse the data, feel free to reference them externally if it's useful.
 # Changing these programattically will, of course, screw up the parsing (unless the format changes and you're using an old copy of this file)
 ##################################
 
@@ -27,6 +34,13 @@ layer_fore_rgb_bytes = 3
 layer_back_rgb_bytes = 3
 layer_cell_bytes = layer_keycode_bytes + layer_fore_rgb_bytes + layer_back_rgb_bytes
 
+# Header fields and cells are little-endian, cells are stored column by column
+xp_header_dt = np.dtype([("version", "<i4"), ("layer_count", "<u4")])
+xp_layer_header_dt = np.dtype([("width", "<u4"), ("height", "<u4")])
+xp_cell_dt = np.dtype([("ch", "<i4"), ("fg", "3u1"), ("bg", "3u1")])
+
+assert xp_cell_dt.itemsize == layer_cell_bytes
+
 
 
 ##################################
@@ -41,53 +55,45 @@ transparent_cell_back_b = 255
 # START LIBTCOD SPECIFIC CODE
 
 ##################################
-# Used primarily internally to parse the data, feel free to reference them externally if it's useful. 
+# Used primarily internally to parse the data, feel free to reference them externally if it's useful.
 # Changing these programattically will, of course, screw up the parsing (unless the format changes and you're using an old copy of this file)
 ##################################
 
 #the solid square character
 poskey_tile_character = 219
 
-#some or all of the below may appear in libtcod's color definitions; and in fact, you can use libtcod colors as you please for position keys. 
+#some or all of the below may appear in libtcod's color definitions; and in fact, you can use libtcod colors as you please for position keys.
 #These are merely the colors provided in the accompanying palette.
 
-poskey_color_red = libtcod.Color(255, 0, 0)
-poskey_color_lightpurple = libtcod.Color(254, 0, 255) # specifically 254 as 255, 0, 255 is considered a transparent key color in REXPaint
-poskey_color_orange = libtcod.Color(255, 128, 0)
-poskey_color_pink = libtcod.Color(255, 0, 128)
-poskey_color_green = libtcod.Color(0, 255, 0)
-poskey_color_teal = libtcod.Color(0, 255, 255)
-poskey_color_yellow = libtcod.Color(255, 255, 0)
-poskey_color_blue = libtcod.Color(0, 0, 255)
-poskey_color_lightblue = libtcod.Color(0, 128, 255)
-poskey_color_purple = libtcod.Color(128, 0, 255)
-poskey_color_white = libtcod.Color(255, 255, 255)
+poskey_color_red = (255, 0, 0)
+poskey_color_lightpurple = (254, 0, 255) # specifically 254 as 255, 0, 255 is considered a transparent key color in REXPaint
+poskey_color_orange = (255, 128, 0)
+poskey_color_pink = (255, 0, 128)
+poskey_color_green = (0, 255, 0)
+poskey_color_teal = (0, 255, 255)
+poskey_color_yellow = (255, 255, 0)
+poskey_color_blue = (0, 0, 255)
+poskey_color_lightblue = (0, 128, 255)
+poskey_color_purple = (128, 0, 255)
+poskey_color_white = (255, 255, 255)
 
 ##################################
-# please note - this function writes the contents of transparent cells to the provided console. 
+# please note - this function writes the contents of transparent cells to the provided console.
 # If you're building an offscreen console and want to use the default (or some other) color for transparency, please call libtcod's console.set_key_color(color)
 ##################################
 
-def load_layer_to_console(console, xp_file_layer):
-	if not xp_file_layer['width'] or not xp_file_layer['height']:
-		raise AttributeError('Attempted to call load_layer_to_console on data that didn\'t have a width or height key, check your data')
-
-	for x in range(xp_file_layer['width']):
-		for y in range(xp_file_layer['height']):
-			cell_data = xp_file_layer['cells'][x][y]
-			fore_color = libtcod.Color(cell_data['fore_r'], cell_data['fore_g'], cell_data['fore_b'])
-			back_color = libtcod.Color(cell_data['back_r'], cell_data['back_g'], cell_data['back_b'])
-			libtcod.console_put_char_ex(console, x, y, cell_data['keycode'], fore_color, back_color)
+def load_layer_to_console(console, xp_file_layer, x=0, y=0):
+	# Works on C and F order consoles alike, console_to_layer gives an [x, y] view either way
+	width, height = xp_file_layer.shape
+	console_to_layer(console)[x:x + width, y:y + height] = xp_file_layer
 
 def get_position_key_xy(xp_file_layer, poskey_color):
-	for x in range(xp_file_layer['width']):
-		for y in range(xp_file_layer['height']):
-			cell_data = xp_file_layer['cells'][x][y]
-			if cell_data['keycode'] == poskey_tile_character:
-				fore_color_matches = cell_data['fore_r'] == poskey_color.r and cell_data['fore_g'] == poskey_color.g and cell_data['fore_b'] == poskey_color.b
-				back_color_matches = cell_data['back_r'] == poskey_color.r and cell_data['back_g'] == poskey_color.g and cell_data['back_b'] == poskey_color.b
-				if fore_color_matches or back_color_matches:
-					return (x, y)
+	poskey_color = tuple(poskey_color)
+	is_key = xp_file_layer['ch'] == poskey_tile_character
+	color_matches = np.all(xp_file_layer['fg'] == poskey_color, axis=-1) | np.all(xp_file_layer['bg'] == poskey_color, axis=-1)
+	matches = np.argwhere(is_key & color_matches)
+	if len(matches):
+		return (int(matches[0][0]), int(matches[0][1]))
 	raise LookupError('No position key was specified for color ' + str(poskey_color) + ', check your .xp file and/or the input color')
 
 
@@ -98,96 +104,119 @@ def get_position_key_xy(xp_file_layer, poskey_color):
 
 
 ##################################
-# loads in an xp file from an unzipped string (gained from opening a .xp file with gzip and calling .read())
-# reverse_endian controls whether the slices containing data for things like layer width, height, number of layers, etc. is reversed 
-# so far as I can tell Python is doing int conversions in big-endian, while the .xp format stores them in little-endian
-# I may just not be aware of it being unneeded, but have it there in case
+# loads in an xp file from an unzipped bytes object (gained from opening a .xp file with gzip and calling .read())
+# Each layer is an np.frombuffer view into file_bytes, so loading costs about as much as finding the layer offsets
+# Layers of a bytes object are read-only, pass a bytearray to get writeable layers
 ##################################
 
-def load_xp_string(file_string, reverse_endian=True):
-
-	offset = 0
-
-	version = file_string[offset : offset + version_bytes]
-	offset += version_bytes
-	layer_count = file_string[offset : offset + layer_count_bytes]
-	offset += layer_count_bytes
-
-	if reverse_endian:
-		version = version[::-1]
-		layer_count = layer_count[::-1]
-
-	# hex-encodes the numbers then converts them to an int
-	version = int(version.encode('hex'), 16)
-	layer_count = int(layer_count.encode('hex'), 16)
+def load_xp(file_bytes):
+	header = np.frombuffer(file_bytes, dtype=xp_header_dt, count=1)[0]
+	offset = xp_header_dt.itemsize
 
 	layers = []
 
-	current_largest_width = 0
-	current_largest_height = 0
+	for layer in range(int(header['layer_count'])):
+		layer_array = parse_layer_array(file_bytes, offset)
+		layers.append(layer_array)
+		offset += xp_layer_header_dt.itemsize + layer_array.nbytes
 
-	for layer in range(layer_count):
-		#slight lookahead to figure out how much data to feed load_layer
+	return make_xp_data(header, layers)
 
-		this_layer_width = file_string[offset:offset + layer_width_bytes]
-		this_layer_height = file_string[offset + layer_width_bytes:offset + layer_width_bytes + layer_height_bytes]
+##################################
+# loads in an xp file from its path, decompressing directly into writeable layer arrays
+# Only the gzip stream's own buffer is held besides the layers, so this suits large files
+##################################
 
-		if reverse_endian:
-			this_layer_width = this_layer_width[::-1]
-			this_layer_height = this_layer_height[::-1]
+def load_xp_file(path):
+	with gzip.open(path, 'rb') as f:
+		header = np.empty(1, dtype=xp_header_dt)
+		read_into(f, header)
 
-		this_layer_width = int(this_layer_width.encode('hex'), 16)
-		this_layer_height = int(this_layer_height.encode('hex'), 16)
+		layers = []
 
-		current_largest_width = max(current_largest_width, this_layer_width)
-		current_largest_height = max(current_largest_height, this_layer_height)
+		for layer in range(int(header[0]['layer_count'])):
+			layer_header = np.empty(1, dtype=xp_layer_header_dt)
+			read_into(f, layer_header)
+			layer_array = np.empty((int(layer_header[0]['width']), int(layer_header[0]['height'])), dtype=xp_cell_dt)
+			read_into(f, layer_array)
+			layers.append(layer_array)
 
-		layer_data_size = layer_width_bytes + layer_height_bytes + (layer_cell_bytes *  this_layer_width * this_layer_height)
+	return make_xp_data(header[0], layers)
 
-		layer_data_raw = file_string[offset:offset + layer_data_size]
-		layer_data = parse_layer(file_string[offset:offset + layer_data_size], reverse_endian)
-		layers.append(layer_data)
+def read_into(f, array):
+	buffer = memoryview(array.reshape(-1).view(np.uint8))
+	filled = 0
+	while filled < len(buffer):
+		count = f.readinto(buffer[filled:])
+		if not count:
+			raise EOFError('Unexpected end of .xp file')
+		filled += count
 
-		offset += layer_data_size
+##################################
+# Width and height are the largest of any layer
+##################################
 
+def make_xp_data(header, layers):
 	return {
-		'version':version,
-		'layer_count':layer_count,
-		'width':current_largest_width,
-		'height':current_largest_height,
-		'layer_data':layers
+		'version':int(header['version']),
+		'layer_count':int(header['layer_count']),
+		'width':max((layer.shape[0] for layer in layers), default=0),
+		'height':max((layer.shape[1] for layer in layers), default=0),
+		'layers':layers
 	}
 
 ##################################
-# Takes a single layer's data and returns the format listed at the top of the file for a single layer.
+# Views a single layer starting at offset as a (width, height) array of xp_cell_dt
+# REXPaint writes cells column by column, which is C order for an [x, y] indexed array
 ##################################
 
-def parse_layer(layer_string, reverse_endian=True):
-	offset = 0
+def parse_layer_array(file_bytes, offset=0):
+	layer_header = np.frombuffer(file_bytes, dtype=xp_layer_header_dt, count=1, offset=offset)[0]
+	width, height = int(layer_header['width']), int(layer_header['height'])
+	cells = np.frombuffer(file_bytes, dtype=xp_cell_dt, count=width * height, offset=offset + xp_layer_header_dt.itemsize)
+	return cells.reshape((width, height))
 
-	width = layer_string[offset:offset + layer_width_bytes]
-	offset += layer_width_bytes
-	height = layer_string[offset:offset + layer_height_bytes]
-	offset += layer_height_bytes
-
-	if reverse_endian:
-		width = width[::-1]
-		height = height[::-1]
-
-	width = int(width.encode('hex'), 16)
-	height = int(height.encode('hex'), 16)
+##################################
+# Legacy loader returning the nested dict format: layer_data is a list of layers, each a dictionary with keys width, height and cells.
+# Cells is a 2d list indexed [x][y] of dictionaries with the values 'keycode' (ascii keycode), 'fore_r/g/b', and 'back_r/g/b' (ints in value 0-255)
+# This builds a Python object per cell, prefer load_xp. reverse_endian is accepted for compatibility and ignored, the format is always little-endian.
+##################################
 
-	cells = []
-	for x in range(width):
-		row = []
+def load_xp_string(file_string, reverse_endian=True):
+	xp_data = load_xp(file_string)
+	return {
+		'version':xp_data['version'],
+		'layer_count':xp_data['layer_count'],
+		'width':xp_data['width'],
+		'height':xp_data['height'],
+		'layer_data':[parse_layer(layer) for layer in xp_data['layers']]
+	}
 
-		for y in range(height):
-			cell_data_raw = layer_string[offset:offset + layer_cell_bytes]
-			cell_data = parse_individual_cell(cell_data_raw, reverse_endian)
-			row.append(cell_data)
-			offset += layer_cell_bytes
+##################################
+# Takes a single layer array and returns the legacy format for a single layer.
+##################################
 
-		cells.append(row)
+def parse_layer(layer_array, reverse_endian=True):
+	width, height = layer_array.shape
+	keycodes = layer_array['ch'].tolist()
+	fore = layer_array['fg'].tolist()
+	back = layer_array['bg'].tolist()
+
+	cells = [
+		[
+			{
+				'keycode':keycodes[x][y],
+				'fore_r':fore[x][y][0],
+				'fore_g':fore[x][y][1],
+				'fore_b':fore[x][y][2],
+				'back_r':back[x][y][0],
+				'back_g':back[x][y][1],
+				'back_b':back[x][y][2],
+			}
+			for y in range(height)
+		]
+		for x in range(width)
+	]
 
 	return {
 		'width':width,
@@ -196,38 +225,36 @@ def parse_layer(layer_string, reverse_endian=True):
 	}
 
 ##################################
-# Pulls out the keycode and the foreground/background RGB values from a single cell's data, returning them in the format listed at the top of this file for a single cell.
+# Writes layers, a list of (width, height) arrays indexed [x, y], as a gzipped .xp file
+# Any structured array with the fields of xp_cell_dt works, such as tcod graphics or tile_types.graphic_dt arrays
+# Each layer is converted to the file's cell layout once and written as a single buffer
 ##################################
 
-def parse_individual_cell(cell_string, reverse_endian=True):
-	offset = 0
+def save_xp(path, layers, version=-1):
+	with gzip.open(path, 'wb') as f:
+		f.write(np.array((version, len(layers)), dtype=xp_header_dt).tobytes())
+		for layer in layers:
+			cells = np.ascontiguousarray(layer, dtype=xp_cell_dt)
+			width, height = cells.shape
+			f.write(np.array((width, height), dtype=xp_layer_header_dt).tobytes())
+			f.write(memoryview(cells.reshape(-1).view(np.uint8)))
+
+##################################
+# Layer helpers for the game's own types
+# A console's graphics are indexed [x, y] regardless of the order it was created with
+##################################
 
-	keycode = cell_string[offset:offset + layer_keycode_bytes]
-	if reverse_endian:
-		keycode = keycode[::-1]
-	keycode = int(keycode.encode('hex'), 16)
-	offset += layer_keycode_bytes
+def console_to_layer(console):
+	graphics = console.tiles_rgb
+	if console.width != console.height:
+		return graphics if graphics.shape[0] == console.width else graphics.T
+	return graphics if graphics.flags.f_contiguous else graphics.T
 
-	fore_r = int(cell_string[offset:offset+1].encode('hex'), 16)
-	offset += 1
-	fore_g = int(cell_string[offset:offset+1].encode('hex'), 16)
-	offset += 1
-	fore_b = int(cell_string[offset:offset+1].encode('hex'), 16)
-	offset += 1
+def game_map_to_layer(game_map, graphic='light'):
+	return getattr(game_map, graphic)
 
-	back_r = int(cell_string[offset:offset+1].encode('hex'), 16)
-	offset += 1
-	back_g = int(cell_string[offset:offset+1].encode('hex'), 16)
-	offset += 1
-	back_b = int(cell_string[offset:offset+1].encode('hex'), 16)
-	offset += 1
+def save_console_xp(path, console):
+	save_xp(path, [console_to_layer(console)])
 
-	return {
-		'keycode':keycode,
-		'fore_r':fore_r,
-		'fore_g':fore_g,
-		'fore_b':fore_b,
-		'back_r':back_r,
-		'back_g':back_g,
-		'back_b':back_b,
-	}
\ No newline at end of file
+def save_game_map_xp(path, game_map, graphic='light'):
+	save_xp(path, [game_map_to_layer(game_map, graphic)])